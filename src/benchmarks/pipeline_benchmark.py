@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+""" Measures the overhead the runner adds around an algorithm by driving AlgorithmRunner.run end to end against stand-in docker and git executables, a stub SYLVA Data Portal and a local MongoDB. Reports wall time per section, MongoDB operations per run and log lines per second for different log volumes as JSON. """
+
+import argparse
+import contextlib
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+from collections import Counter
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import yaml
+
+from pymongo import MongoClient, monitoring
+
+BENCHMARK_PATH = os.path.dirname(os.path.abspath(__file__))
+SOURCE_PATH = os.path.dirname(BENCHMARK_PATH)
+sys.path.insert(0, SOURCE_PATH)
+
+from sylva_algorithm_runner import AlgorithmRunner, AlgorithmRunOrder, RunSection
+
+
+class CommandCounter(monitoring.CommandListener):
+    """ Counts MongoDB commands sent by all clients of this process. """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.commands = Counter()
+
+    def started(self, event):
+        with self.lock:
+            self.commands[event.command_name] += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+    def take(self) -> Counter:
+        """ Returns the commands counted since last call. """
+        with self.lock:
+            commands, self.commands = self.commands, Counter()
+            return commands
+
+
+class DataPortalStub(BaseHTTPRequestHandler):
+    """ Answers workspace orders with a new workspace id and reports every workspace as provided. """
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.__respond({"id": str(uuid.uuid4())})
+
+    def do_GET(self):
+        self.__respond({"status": "provided"})
+
+    def log_message(self, format, *args):
+        pass
+
+    def __respond(self, content: dict):
+        body = json.dumps(content).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def create_configuration(arguments, work_path: str, dataportal_url: str) -> dict:
+    """ Returns the configuration of the package with paths, database and data portal pointing to benchmark resources. """
+    with open(os.path.join(SOURCE_PATH, "etc", "sylva-algorithm-runner", "config.yaml"), "r") as file:
+        configuration = yaml.safe_load(file)
+
+    configuration["database"].update({"host": arguments.mongo_host, "port": arguments.mongo_port, "user": arguments.mongo_user, "password": arguments.mongo_password, "database": arguments.mongo_database})
+    configuration["dataportal"].update({"workspace": dataportal_url, "token": "benchmark"})
+
+    runner_configuration = configuration["runner"]
+    runner_configuration.update({"path": os.path.join(work_path, "runs"), "workspace": os.path.join(work_path, "workspace"), "output": os.path.join(work_path, "output")})
+    runner_configuration["container-backend"] = arguments.backend
+    runner_configuration["git-mirror"]["enabled"] = arguments.git_mirror
+    runner_configuration["image-cache"]["enabled"] = arguments.image_cache
+    if arguments.no_log_buffer:
+        del runner_configuration["log-buffer"]
+
+    for path in [runner_configuration["path"], runner_configuration["workspace"], runner_configuration["output"]]:
+        os.makedirs(path, exist_ok=True)
+
+    return configuration
+
+
+def run_once(configuration: dict, database, log_lines: int, counter: CommandCounter) -> dict:
+    """ Runs one algorithm run order and returns its measurements. """
+    order = AlgorithmRunOrder(f"benchmark-{uuid.uuid4()}", {}, "benchmark", "benchmark/algorithm", "v1", "benchmark-dataset", None)
+    order._id = database.algorithmRunOrders.insert_one({**order.to_dict(), "eligible": True}).inserted_id
+
+    # the fake backend is configured per run, the stand-in docker executable by environment
+    configuration["runner"]["fake-backend"] = {"log-lines": log_lines, "output-files": {f"{index % 10}/output-{index}.bin": 1024 for index in range(10)}}
+    os.environ["BENCHMARK_LOG_LINES"] = str(log_lines)
+
+    counter.take()
+    runner = AlgorithmRunner(configuration["runner"], configuration["dataportal"], configuration["database"], configuration["security"])
+
+    # runner echoes log lines to stdout, which must not mix with results
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        runner.run(order)
+        wall_time = time.perf_counter() - start
+
+    commands = counter.take()
+    run = database.algorithmRuns.find_one({"runOrder": order._id})
+
+    sections = {}
+    for run_section in RunSection:
+        section = run.get("sections", {}).get(run_section.value)
+        if section is not None and section.get("start") is not None and section.get("end") is not None:
+            sections[run_section.value] = (section["end"] - section["start"]).total_seconds()
+
+    run_algorithm_time = sections.get(RunSection.RUN_ALGORITHM.value)
+    return {
+        "status": run["status"],
+        "wallTime": wall_time,
+        "sections": sections,
+        "mongoOperations": sum(commands.values()),
+        "mongoCommands": dict(commands),
+        "logLinesPerSecond": log_lines / run_algorithm_time if run_algorithm_time else None,
+        "logStatistics": run.get("logStatistics")
+    }
+
+
+def summarize(measurements: list) -> dict:
+    """ Returns the median of all numeric measurements of the repetitions of one scenario. """
+    def median(values: list):
+        values = [value for value in values if value is not None]
+        return statistics.median(values) if len(values) > 0 else None
+
+    section_names = sorted({name for measurement in measurements for name in measurement["sections"]})
+    command_names = sorted({name for measurement in measurements for name in measurement["mongoCommands"]})
+
+    return {
+        "statuses": dict(Counter(measurement["status"] for measurement in measurements)),
+        "wallTime": median([measurement["wallTime"] for measurement in measurements]),
+        "sections": {name: median([measurement["sections"].get(name) for measurement in measurements]) for name in section_names},
+        "mongoOperations": median([measurement["mongoOperations"] for measurement in measurements]),
+        "mongoCommands": {name: median([measurement["mongoCommands"].get(name, 0) for measurement in measurements]) for name in command_names},
+        "logLinesPerSecond": median([measurement["logLinesPerSecond"] for measurement in measurements])
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """ Returns a description of every scenario which got slower or needs more database operations than in baseline by more than the given tolerance. """
+    regressions = []
+    baseline_scenarios = {scenario["logLines"]: scenario["summary"] for scenario in baseline["scenarios"]}
+
+    for scenario in results["scenarios"]:
+        before = baseline_scenarios.get(scenario["logLines"])
+        if before is None:
+            continue
+
+        for metric in ["wallTime", "mongoOperations"]:
+            if before[metric] and scenario["summary"][metric] > before[metric] * (1 + tolerance):
+                regressions.append(f"{scenario['logLines']} log lines: {metric} {before[metric]:.3f} -> {scenario['summary'][metric]:.3f}")
+
+        if before["logLinesPerSecond"] and scenario["summary"]["logLinesPerSecond"] is not None and scenario["summary"]["logLinesPerSecond"] < before["logLinesPerSecond"] * (1 - tolerance):
+            regressions.append(f"{scenario['logLines']} log lines: logLinesPerSecond {before['logLinesPerSecond']:.1f} -> {scenario['summary']['logLinesPerSecond']:.1f}")
+
+    return regressions
+
+
+parser = argparse.ArgumentParser(description="""Benchmarks the runner pipeline with stand-in docker and git, a stub data portal and a local MongoDB. Writes results as JSON.""")
+parser.add_argument("--log-lines", type=int, nargs="+", default=[100, 1000, 10000], help="log volumes of the algorithm to benchmark")
+parser.add_argument("--repeat", type=int, default=3, help="runs per log volume")
+parser.add_argument("--backend", choices=["cli", "fake"], default="cli", help="container backend, cli uses the stand-in docker executable")
+parser.add_argument("--git-mirror", action="store_true", help="clone via local mirror")
+parser.add_argument("--image-cache", action="store_true", help="reuse images via image cache")
+parser.add_argument("--no-log-buffer", action="store_true", help="write every log line on its own")
+parser.add_argument("--mongo-host", default="localhost")
+parser.add_argument("--mongo-port", type=int, default=27017)
+parser.add_argument("--mongo-user", default=None)
+parser.add_argument("--mongo-password", default=None)
+parser.add_argument("--mongo-database", default="algorithm-benchmark", help="database used and dropped by the benchmark")
+parser.add_argument("--output", help="file to write results to instead of stdout")
+parser.add_argument("--baseline", help="results of an earlier benchmark to compare with, exits with 1 on regressions")
+parser.add_argument("--tolerance", type=float, default=0.2, help="relative deviation from baseline accepted")
+arguments = parser.parse_args()
+
+counter = CommandCounter()
+monitoring.register(counter)
+
+work_path = tempfile.mkdtemp(prefix="sylva-benchmark-")
+os.environ["PATH"] = os.path.join(BENCHMARK_PATH, "bin") + os.pathsep + os.environ["PATH"]
+os.environ["BENCHMARK_DOCKER_STATE"] = os.path.join(work_path, "docker")
+for executable in os.listdir(os.path.join(BENCHMARK_PATH, "bin")):
+    os.chmod(os.path.join(BENCHMARK_PATH, "bin", executable), 0o755)
+
+AlgorithmRunner.dockerfile_template = os.path.join(SOURCE_PATH, "var", "lib", "sylva-algorithm-runner", "Dockerfile.template")
+
+dataportal = ThreadingHTTPServer(("localhost", 0), DataPortalStub)
+threading.Thread(target=dataportal.serve_forever, daemon=True).start()
+
+mongo_client = MongoClient(arguments.mongo_host, port=arguments.mongo_port, username=arguments.mongo_user, password=arguments.mongo_password, authSource="admin", tz_aware=True)
+mongo_client.drop_database(arguments.mongo_database)
+
+try:
+    configuration = create_configuration(arguments, work_path, f"http://localhost:{dataportal.server_port}/workspace")
+    database = mongo_client[arguments.mongo_database]
+
+    results = {
+        "created": datetime.now().isoformat(),
+        "settings": {"backend": arguments.backend, "gitMirror": arguments.git_mirror, "imageCache": arguments.image_cache, "logBuffer": not arguments.no_log_buffer, "repeat": arguments.repeat},
+        "scenarios": []
+    }
+
+    for log_lines in arguments.log_lines:
+        measurements = [run_once(configuration, database, log_lines, counter) for _ in range(arguments.repeat)]
+        results["scenarios"].append({"logLines": log_lines, "summary": summarize(measurements), "runs": measurements})
+
+finally:
+    dataportal.shutdown()
+    mongo_client.drop_database(arguments.mongo_database)
+    shutil.rmtree(work_path, ignore_errors=True)
+
+if arguments.output is not None:
+    with open(arguments.output, "w") as file:
+        json.dump(results, file, indent=2)
+else:
+    print(json.dumps(results, indent=2))
+
+if arguments.baseline is not None:
+    with open(arguments.baseline, "r") as file:
+        regressions = compare(results, json.load(file), arguments.tolerance)
+
+    for regression in regressions:
+        print(f"Regression: {regression}", file=sys.stderr)
+
+    sys.exit(1 if len(regressions) > 0 else 0)
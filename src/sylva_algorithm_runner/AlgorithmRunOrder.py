@@ -1,3 +1,4 @@
+import re
 import yaml
 
 from enum import Enum
@@ -8,7 +9,7 @@ class AlgorithmRunOrderStatus(Enum):
     INVALID = "INVALID"
 
 class AlgorithmRunOrder():
-    """ Class to represent an order to run an algorithm. Basically a mapping between database document and Python object. """
+    """ Class to represent an order to run an algorithm. Basically a mapping between database document and Python object. A matrix run order lists several versions and/or datasets; it is never run itself but expands into one child run order per combination. """
     _id: str = None
     status = AlgorithmRunOrderStatus.CREATED
 
@@ -22,7 +23,15 @@ class AlgorithmRunOrder():
     dataset: str = None
     localpath: str = None
 
-    def __init__(self, source_id: str, source: dict, algorithm: str, algorithm_repository: str, algorithm_version: str, dataset_id: str, localpath: str, _id: str = None) -> None:
+    # optional, cpus as float and memory in bytes
+    resources: dict = None
+
+    # matrix run orders only, lists of versions and of datasets or localpaths
+    matrix: dict = None
+    # child run orders of a matrix run order only, sourceId of matrix run order
+    parent: str = None
+
+    def __init__(self, source_id: str, source: dict, algorithm: str, algorithm_repository: str, algorithm_version: str, dataset_id: str, localpath: str, _id: str = None, resources: dict = None, matrix: dict = None, parent: str = None) -> None:
         self.sourceId = source_id
         self.source = source
         self.algorithm = algorithm
@@ -31,10 +40,17 @@ class AlgorithmRunOrder():
         self.dataset = dataset_id
         self.localpath = localpath
         self._id = _id
+        self.resources = resources
+        self.matrix = matrix
+        self.parent = parent
+
+
+    def is_matrix(self) -> bool:
+        return self.matrix is not None
 
 
     def is_valid(self) -> bool:
-        return self.algorithm is not None and self.algorithmRepository is not None and self.algorithmVersion is not None and (self.dataset is not None) != (self.localpath is not None)
+        return not self.is_matrix() and self.algorithm is not None and self.algorithmRepository is not None and self.algorithmVersion is not None and (self.dataset is not None) != (self.localpath is not None)
 
 
     def to_dict(self) -> dict:
@@ -46,7 +62,10 @@ class AlgorithmRunOrder():
             'algorithmRepository': self.algorithmRepository,
             'algorithmVersion': self.algorithmVersion,
             'dataset': self.dataset,
-            'localpath': self.localpath
+            'localpath': self.localpath,
+            'resources': self.resources,
+            'matrix': self.matrix,
+            'parent': self.parent
         }
     
 
@@ -64,7 +83,10 @@ class AlgorithmRunOrder():
 
         _id = data.get('_id')
 
-        return AlgorithmRunOrder(source_id, source, algorithm, algorithm_repository, algorithm_version, dataset_id, localpath, _id)
+        # run orders stored before resources were introduced have them in their source only
+        resources = data.get('resources') if 'resources' in data else AlgorithmRunOrder.__parse_resources(source)
+
+        return AlgorithmRunOrder(source_id, source, algorithm, algorithm_repository, algorithm_version, dataset_id, localpath, _id, resources, data.get('matrix'), data.get('parent'))
     
     
     @staticmethod
@@ -91,4 +113,75 @@ class AlgorithmRunOrder():
             # no-op by intention
             pass
 
-        return AlgorithmRunOrder(source_id, source, algorithm, algorithmRepository, algorithmVersion, dataset, localpath)
+        resources = AlgorithmRunOrder.__parse_resources(source)
+
+        # lists of versions and/or datasets make a matrix run order
+        if any(isinstance(value, list) for value in [algorithmVersion, dataset, localpath]):
+            matrix = {
+                'versions': AlgorithmRunOrder.__as_list(algorithmVersion),
+                'datasets': AlgorithmRunOrder.__as_list(dataset),
+                'localpaths': AlgorithmRunOrder.__as_list(localpath)
+            }
+            return AlgorithmRunOrder(source_id, source, algorithm, algorithmRepository, None, None, None, resources=resources, matrix=matrix)
+
+        return AlgorithmRunOrder(source_id, source, algorithm, algorithmRepository, algorithmVersion, dataset, localpath, resources=resources)
+
+
+    def expand(self) -> list:
+        """ Returns one child run order per combination of version and dataset (or localpath) of this matrix run order, an empty list if it is none. """
+        if not self.is_matrix():
+            return []
+
+        children = []
+        for version in self.matrix['versions']:
+            for dataset in self.matrix['datasets']:
+                children.append(AlgorithmRunOrder(f"{self.sourceId}#{version}@{dataset}", self.source, self.algorithm, self.algorithmRepository, version, dataset, None, resources=self.resources, parent=self.sourceId))
+            for localpath in self.matrix['localpaths']:
+                children.append(AlgorithmRunOrder(f"{self.sourceId}#{version}@{localpath}", self.source, self.algorithm, self.algorithmRepository, version, None, localpath, resources=self.resources, parent=self.sourceId))
+
+        return children
+
+
+    @staticmethod
+    def __as_list(value) -> list:
+        if value is None:
+            return []
+
+        # duplicates would expand into the same child run order twice
+        return list(dict.fromkeys(str(item) for item in value)) if isinstance(value, list) else [value]
+
+
+    @staticmethod
+    def parse_memory(memory) -> int:
+        """ Converts memory given as number of bytes or as string with unit like docker does (e.g. 512m, 8g) to bytes. """
+        if isinstance(memory, (int, float)):
+            return int(memory)
+
+        match = re.fullmatch(r"(\d+(?:\.\d+)?)\s*([bkmgt]?)b?", str(memory).strip().lower())
+        if match is None:
+            raise ValueError(f"Invalid memory {memory}")
+
+        return int(float(match.group(1)) * 1024 ** "bkmgt".index(match.group(2) or "b"))
+
+
+    @staticmethod
+    def __parse_resources(source: str) -> dict:
+        """ Returns cpus and memory requested by the optional resources block of the given YAML source, None if nothing valid is requested. """
+        try:
+            yaml_resources = yaml.safe_load(source).get('resources')
+        except Exception as e:
+            return None
+
+        if not isinstance(yaml_resources, dict):
+            return None
+
+        resources = {}
+        try:
+            if yaml_resources.get('cpus') is not None:
+                resources['cpus'] = float(yaml_resources['cpus'])
+            if yaml_resources.get('memory') is not None:
+                resources['memory'] = AlgorithmRunOrder.parse_memory(yaml_resources['memory'])
+        except ValueError:
+            return None
+
+        return resources if len(resources) > 0 else None
@@ -0,0 +1,232 @@
+import os
+import signal
+import subprocess
+import time
+
+from datetime import datetime
+
+from sylva_algorithm_runner.YamlConfiguration import YamlConfiguration
+from sylva_algorithm_runner.AlgorithmRunOrder import AlgorithmRunOrder
+from sylva_algorithm_runner.DataAvailabilityPoller import DataAvailabilityPoller
+from sylva_algorithm_runner.RunOrderLease import RunOrderLease
+from sylva_algorithm_runner.RunRecovery import RunRecovery
+from sylva_algorithm_runner.repositories.DatabaseRepository import DatabaseRepository
+
+
+class AlgorithmRunScheduler:
+    """ Long-running replacement for the cron based autostart. Keeps track of its own sylva-algorithm-run child processes, reaps them when they are finished and starts the next run orders as soon as a slot is free. Eligible run orders are packed first fit by their requested CPUs and memory into the capacity of the host which is not reserved by running ones. A run order skipped for lack of capacity longer than starvation_timeout stops packing, so capacity freed by finishing runs is held back for it. """
+    configuration_file = None
+    process_id = None
+    override_enabled = False
+
+    poll_interval = 120
+    retry_interval = 120
+    tick = 1
+
+    # number of eligible run orders considered per scheduling round
+    candidate_count = 100
+    default_resources = {"cpus": 1, "memory": "2g"}
+    starvation_timeout = 900
+
+    def __init__(self, configuration_file: str, process_id: str, override_enabled: bool = False) -> None:
+        self.configuration_file = configuration_file
+        self.process_id = process_id
+        self.override_enabled = override_enabled
+
+        configuration = YamlConfiguration(self.configuration_file)
+        self.database_repository = DatabaseRepository(configuration.get("database"))
+        self.data_availability_poller = DataAvailabilityPoller(configuration.get("dataportal"), self.database_repository)
+
+        self.__children = {}
+        self.__adopted = {}
+        self.__last_started = {}
+        self.__reserved = {}
+        self.__skipped_since = {}
+        self.__stopped = False
+
+    def stop(self, *args):
+        """ Stops starting new runs. Already started runs are left running. """
+        self.__log("INFO", "Stop requested, no further runs will be started.")
+        self.__stopped = True
+
+    def run_forever(self):
+        """ Runs the scheduling loop until stop() is called (e.g. by SIGTERM). """
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        # runs started before this scheduler (e.g. by cron or by a previous instance) still occupy their slots
+        for pid, order_id in self.__find_running_processes().items():
+            self.__adopted[pid] = order_id
+            self.__reserved[order_id] = None
+            self.__log("INFO", f"Adopted running process {pid} for {order_id}.")
+
+        for run_order in self.database_repository.get_algorithm_run_orders_by_id_raw(list(self.__adopted.values()), { "_id": 1, "resources": 1, "source": 1 }):
+            self.__reserved[str(run_order["_id"])] = AlgorithmRunOrder.from_dict(run_order).resources
+
+        next_poll = 0
+        while not self.__stopped:
+            if self.__reap() or time.monotonic() >= next_poll:
+                self.__schedule()
+                next_poll = time.monotonic() + self.poll_interval
+
+            time.sleep(self.tick)
+
+    def __schedule(self):
+        runner_configuration = YamlConfiguration(self.configuration_file).get("runner")
+        self.poll_interval = runner_configuration.get("run-autostart-poll-interval", self.poll_interval)
+        self.retry_interval = runner_configuration.get("run-autostart-retry-interval", self.retry_interval)
+        self.starvation_timeout = runner_configuration.get("starvation-timeout", self.starvation_timeout)
+
+        if not (runner_configuration["run-autostart-enabled"] == True or self.override_enabled):
+            return
+
+        self.__recover(runner_configuration)
+
+        released_count = self.data_availability_poller.poll()
+        if released_count > 0:
+            self.__log("INFO", f"Data of {released_count} waiting runs became available.")
+
+        # do not pick up orders that are running or were started shortly before (e.g. runs waiting for data)
+        now = time.monotonic()
+        self.__last_started = {id: started for id, started in self.__last_started.items() if now - started < self.retry_interval}
+        excluded_ids = set(self.__last_started.keys()) | set(self.__children.values()) | set(self.__adopted.values())
+
+        # slots are held by leases in database, own children count as well as they may not have claimed their run order yet
+        slots_left = min(runner_configuration["parallel"] - len(self.__children) - len(self.__adopted), RunOrderLease(runner_configuration, self.database_repository).get_free_slot_count())
+        if slots_left <= 0:
+            return
+
+        capacity = self.__get_capacity(runner_configuration)
+        default_resources = self.__get_requested_resources(runner_configuration.get("default-resources", self.default_resources), {"cpus": 0, "memory": 0})
+
+        free = dict(capacity)
+        for resources in self.__reserved.values():
+            for name, value in self.__get_requested_resources(resources, default_resources).items():
+                free[name] -= value
+
+        candidates = self.database_repository.find_eligible_run_orders_raw(self.candidate_count, list(excluded_ids), { "_id": 1, "resources": 1, "source": 1 })
+
+        # run orders started or not eligible anymore are not waiting
+        candidate_ids = {str(candidate["_id"]) for candidate in candidates}
+        self.__skipped_since = {id: since for id, since in self.__skipped_since.items() if id in candidate_ids}
+
+        for candidate in candidates:
+            if slots_left <= 0:
+                break
+
+            id_to_run = str(candidate["_id"])
+            resources = AlgorithmRunOrder.from_dict(candidate).resources
+            requested = self.__get_requested_resources(resources, default_resources)
+
+            # a run order requesting more than the host has can run only on an otherwise idle host
+            if any(requested[name] > free[name] for name in free) and len(self.__reserved) > 0:
+                skipped_since = self.__skipped_since.setdefault(id_to_run, now)
+                if now - skipped_since >= self.starvation_timeout:
+                    self.__log("INFO", f"Holding back capacity for {id_to_run}, which waits for {int(now - skipped_since)} seconds.")
+                    break
+                continue
+
+            self.__skipped_since.pop(id_to_run, None)
+
+            self.__log("INFO", f"Starting {id_to_run} requesting {requested['cpus']} CPUs and {requested['memory']} bytes of memory.")
+            process = subprocess.Popen(["sylva-algorithm-run", id_to_run])
+            self.__children[process.pid] = id_to_run
+            self.__last_started[id_to_run] = time.monotonic()
+            self.__reserved[id_to_run] = resources
+
+            for name in free:
+                free[name] -= requested[name]
+            slots_left -= 1
+
+    @staticmethod
+    def __get_capacity(runner_configuration: dict) -> dict:
+        """ Returns CPUs and memory available for runs as configured by runner.capacity, defaulting to all of the host. """
+        capacity_configuration = runner_configuration.get("capacity") or {}
+
+        cpus = capacity_configuration.get("cpus")
+        memory = capacity_configuration.get("memory")
+
+        return {
+            "cpus": float(cpus) if cpus is not None else float(os.cpu_count() or 1),
+            "memory": AlgorithmRunOrder.parse_memory(memory) if memory is not None else os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+        }
+
+    @staticmethod
+    def __get_requested_resources(resources: dict, default_resources: dict) -> dict:
+        """ Returns CPUs and memory in bytes of the given requested resources, missing ones taken from given defaults. """
+        resources = resources or {}
+
+        return {
+            "cpus": float(resources["cpus"]) if resources.get("cpus") is not None else default_resources["cpus"],
+            "memory": AlgorithmRunOrder.parse_memory(resources["memory"]) if resources.get("memory") is not None else default_resources["memory"]
+        }
+
+    def __recover(self, runner_configuration: dict):
+        """ Makes runs of crashed runners resumable and removes containers and images left behind by finished runs. """
+        try:
+            recovered = RunRecovery(runner_configuration, self.database_repository).recover()
+        except Exception as e:
+            self.__log("ERROR", f"Recovery failed: {e}")
+            return
+
+        for run_order_id in recovered["reclaimed"]:
+            self.__log("INFO", f"Lease of {run_order_id} expired, its run will be resumed.")
+        for name in recovered["containers"] + recovered["images"]:
+            self.__log("INFO", f"Removed orphaned {name}.")
+        for run_id in recovered["unpinned"]:
+            self.__log("INFO", f"Released image cache pins of {run_id}.")
+
+    def __reap(self) -> bool:
+        """ Removes finished child and adopted processes. Returns True if at least one slot became free. """
+        freed = False
+
+        for pid, order_id in list(self.__children.items()):
+            try:
+                finished_pid, exit_status = os.waitpid(pid, os.WNOHANG)
+            except ChildProcessError:
+                finished_pid, exit_status = pid, 0
+
+            if finished_pid != 0:
+                self.__log("INFO", f"Run of {order_id} finished with exit code {os.waitstatus_to_exitcode(exit_status)}.")
+                del self.__children[pid]
+                self.__reserved.pop(order_id, None)
+                freed = True
+
+        for pid, order_id in list(self.__adopted.items()):
+            try:
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                self.__log("INFO", f"Adopted run of {order_id} finished.")
+                del self.__adopted[pid]
+                self.__reserved.pop(order_id, None)
+                freed = True
+            except PermissionError:
+                pass
+
+        return freed
+
+    @staticmethod
+    def __find_running_processes() -> dict:
+        """ Returns process id and run order id of all running sylva-algorithm-run processes on local machine. """
+        processes = {}
+
+        for entry in os.listdir("/proc"):
+            if not entry.isdigit():
+                continue
+
+            try:
+                with open(os.path.join("/proc", entry, "cmdline"), "rb") as cmdline_file:
+                    arguments = [argument.decode(errors="replace") for argument in cmdline_file.read().split(b"\0") if argument]
+            except OSError:
+                continue
+
+            # either executed directly or via interpreter, e.g. "python3 /usr/bin/sylva-algorithm-run <id>"
+            for index, argument in enumerate(arguments[:2]):
+                if os.path.basename(argument) == "sylva-algorithm-run" and len(arguments) > index + 1:
+                    processes[int(entry)] = arguments[index + 1]
+                    break
+
+        return processes
+
+    def __log(self, level: str, message: str):
+        print("{0} - {1} - {2} - {3}".format(datetime.now().isoformat(), self.process_id, level, message), flush=True)
@@ -1,13 +1,24 @@
 import os
+import re
 import shutil
 import subprocess
 import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
 
 from sylva_algorithm_runner import AlgorithmRunOrder
+from sylva_algorithm_runner.ContainerStatsSampler import ContainerStatsSampler
+from sylva_algorithm_runner.DataAvailabilityPoller import DataAvailabilityPoller
+from sylva_algorithm_runner.ImageCache import ImageCache
+from sylva_algorithm_runner.GitMirror import GitMirror
+from sylva_algorithm_runner.OutputManifest import OutputManifest
+from sylva_algorithm_runner.backends import create_container_backend
+from sylva_algorithm_runner.repositories.DatabaseRepository import DatabaseRepository
 from sylva_algorithm_runner.repositories.LogRepository import LogRepository
 import json
-import requests
+from datetime import datetime, timedelta, timezone
 
 class RunSection(Enum):
     """ Enum for the different sections (aka steps) of an algorithm run. """
@@ -28,6 +39,7 @@ class Status(Enum):
     SUCCESS = "SUCCESS"
     FAILURE = "FAILURE"
     WAITING_FOR_DATA = "WAITING_FOR_DATA"
+    INTERRUPTED = "INTERRUPTED"
 
 
 class AlgorithmRunner:
@@ -36,11 +48,26 @@ class AlgorithmRunner:
     runner_configuration = None
     database_configuration = None
     log_repository = None
+    database_repository = None
+    image_cache = None
+    git_mirror = None
+    container_backend = None
+    dockerfile_template = "/var/lib/sylva-algorithm-runner/Dockerfile.template"
 
     algorithm_container_name = None
     algorithm_docker_image_name = None
     run_docker_image_name = None
+    image_cache_key = None
     workspace_id = None
+    # dataset this run claimed to order a workspace for, until it is registered or ordering failed
+    data_workspace_claim = None
+    sections = {}
+    aborted = False
+    preparation_failed = None
+
+    # how long to wait for a concurrent run ordering the same dataset
+    workspace_claim_timeout = 120
+    workspace_claim_interval = 2
 
 
     def __init__(self, runner_configuration, dataportal_configuration, database_configuration, security_configuration): 
@@ -49,21 +76,63 @@ class AlgorithmRunner:
         self.database_configuration = database_configuration
         self.security_configuration = security_configuration
 
-        self.log_repository = LogRepository(self.database_configuration, True)
+        self.log_repository = LogRepository(self.database_configuration, True, self.runner_configuration.get("log-buffer"))
+        self.database_repository = DatabaseRepository(self.database_configuration)
+        self.container_backend = create_container_backend(self.runner_configuration)
+        # status requests to SYLVA Data Portal share the pooled session and timeout of the poller
+        self.data_availability_poller = DataAvailabilityPoller(self.dataportal_configuration, self.database_repository)
+
+        image_cache_configuration = self.runner_configuration.get("image-cache", {})
+        if image_cache_configuration.get("enabled", False):
+            self.image_cache = ImageCache(self.runner_configuration["path"], image_cache_configuration, self.container_backend)
+
+        if self.runner_configuration.get("git-mirror", {}).get("enabled", False):
+            self.git_mirror = GitMirror(self.runner_configuration["path"])
 
 
-    def __init_run(self, pid: str, workspace_id: str = None):
+    def abort(self):
+        """ Stops the current run without noting anything about it anymore, e.g. as its lease was lost and it may be resumed by another runner. The algorithm container is removed, so the algorithm does not run twice. """
+        self.aborted = True
+        self.log_repository.stop()
+
+        try:
+            self.__release_data_workspace_claim()
+        except Exception as e:
+            # lease may be lost as database is not reachable, the claim expires then
+            print(f"Could not release claim of data workspace: {e}")
+
+        if self.algorithm_container_name is not None and self.container_backend.get_container_state(self.algorithm_container_name) is not None:
+            self.container_backend.remove_container(self.algorithm_container_name, print, force=True)
+
+
+    def close(self):
+        """ Writes all log lines still queued, to be called before the process exits. """
+        self.log_repository.close()
+
+
+    def __init_run(self, pid: str, workspace_id: str = None, images: dict = None, sections: dict = None):
         self.pid = pid
+        self.sections = sections if sections is not None else {}
         self.algorithm_container_name = f"{self.pid}-algorithm_container"
         self.algorithm_docker_image_name = f"{self.pid}-algorithm:latest"
         self.run_docker_image_name = f"{self.pid}-run:latest"
         self.working_dir = os.path.join(self.runner_configuration["path"], self.pid)
         self.workspace_id = workspace_id
 
+        if images is not None:
+            # images were taken from image cache when this run was prepared
+            self.algorithm_docker_image_name = images["algorithm"]
+            self.run_docker_image_name = images["run"]
+            self.image_cache_key = images["cacheKey"]
+
 
     def run(self, algorithm_run_order: AlgorithmRunOrder):
-        """ Runs an algorithm based on the given AlgorithmRunOrder."""
-        existing_run = self.log_repository.get_waiting_for_data(algorithm_run_order)
+        """ Runs an algorithm based on the given AlgorithmRunOrder. A run waiting for data or interrupted (e.g. by a crash of its host) is continued, sections completed successfully before are not repeated. """
+        existing_run = self.log_repository.get_resumable_run(algorithm_run_order)
+
+        if self.image_cache is None and algorithm_run_order.parent is not None:
+            # children of a matrix run order build the images of each version once, also if image cache is disabled
+            self.image_cache = ImageCache(self.runner_configuration["path"], self.runner_configuration.get("image-cache", {}), self.container_backend)
 
         try:
             if (existing_run is None):
@@ -77,10 +146,17 @@ class AlgorithmRunner:
                 self.log_repository.start_section(self.pid, RunSection.WAIT_FOR_DATA)
 
             else:
-                self.__init_run(str(existing_run["_id"]), existing_run["workspace"])
-                self.workspace_id = existing_run["workspace"]
+                self.__init_run(str(existing_run["_id"]), existing_run.get("workspace"), existing_run.get("images"), existing_run.get("sections"))
+
+                if existing_run["status"] == Status.INTERRUPTED.value:
+                    self.log_repository.set_status(self.pid, Status.RUNNING)
+                    os.makedirs(self.working_dir, exist_ok=True)
+
+                    self.__create_and_prepare_run(algorithm_run_order)
+                    if "start" not in self.sections.get(RunSection.WAIT_FOR_DATA.value, {}):
+                        self.log_repository.start_section(self.pid, RunSection.WAIT_FOR_DATA)
             
-            data_available = (algorithm_run_order.localpath is not None) or self.__check_data_available()
+            data_available = (algorithm_run_order.localpath is not None) or self.__is_completed(RunSection.WAIT_FOR_DATA) or self.__check_data_available()
             
             if (not data_available):
                 self.log_repository.set_status(self.pid, Status.WAITING_FOR_DATA)
@@ -98,23 +174,93 @@ class AlgorithmRunner:
                     raise Exception()
                 
                 else:
-                    self.log_repository.end_section(self.pid, RunSection.WAIT_FOR_DATA, Status.SUCCESS)
+                    if not self.__is_completed(RunSection.WAIT_FOR_DATA):
+                        self.log_repository.end_section(self.pid, RunSection.WAIT_FOR_DATA, Status.SUCCESS)
                     self.log_repository.set_status(self.pid, Status.RUNNING)
-                    self.__run_algorithm(workspace_path)
+                    self.__run_algorithm(workspace_path, algorithm_run_order.resources)
 
         except:
+            if self.aborted:
+                # working directory and images are left to the runner resuming this run
+                print(f"Run {self.pid} aborted.")
+                return
+
             self.__clean()
             self.log_repository.end_run(self.pid, Status.FAILURE)
 
 
     def __create_and_prepare_run(self, algorithm_run_order: AlgorithmRunOrder):
-        """ Creates a new run and prepares it based on the given AlgorithmRunOrder. """        
-        
-        # start with ordering data as this may take some minutes
-        if (algorithm_run_order.dataset is not None):
-            # in case of dataset, API of SYLVA Data Portal is used
-            curl_command = ["curl", "-s", "-X", "POST", self.dataportal_configuration["workspace"], "-H", "Content-Type: application/json", "-d", json.dumps({"dataset": algorithm_run_order.dataset, "token": self.dataportal_configuration["token"]})]
-            response = self.__run_and_log_section(RunSection.ORDER_DATA, curl_command, return_response_if_success=True)
+        """ Creates a new run and prepares it based on the given AlgorithmRunOrder. Sections of an interrupted run which were completed already are skipped if their result is still present. Preparation consists of two independent branches run at the same time: ordering data (ORDER_DATA) and getting the docker images (CLONE, BUILD_ALGORITHM_IMAGE, BUILD_ALGORITHM_RUN_IMAGE). Both need to succeed, a branch skips its remaining sections once the other one failed. """
+        started = time.monotonic()
+        self.preparation_failed = threading.Event()
+
+        # ordering data may take some minutes, images do not depend on the workspace
+        with ThreadPoolExecutor(max_workers=2, thread_name_prefix="prepare") as executor:
+            branches = {name: executor.submit(self.__run_timed, branch, algorithm_run_order) for name, branch in [("orderData", self.__order_data), ("images", self.__prepare_images)]}
+
+        # each branch has logged the status of its sections already
+        if any(future.exception() is not None for future in branches.values()):
+            raise Exception()
+
+        durations = {name: future.result() for name, future in branches.items()}
+        wall_time = time.monotonic() - started
+        self.log_repository.log_preparation(self.pid, {**durations, "wallTime": wall_time, "saved": max(0.0, sum(durations.values()) - wall_time)})
+
+
+    def __run_timed(self, branch, algorithm_run_order: AlgorithmRunOrder) -> float:
+        """ Runs the given preparation branch and returns its duration in seconds. """
+        started = time.monotonic()
+        try:
+            branch(algorithm_run_order)
+        except:
+            self.preparation_failed.set()
+            raise
+
+        return time.monotonic() - started
+
+
+    def __skip_if_preparation_failed(self):
+        """ Raises if the other preparation branch failed, so no further sections are run for a failed run. """
+        if self.preparation_failed is not None and self.preparation_failed.is_set():
+            raise Exception()
+
+
+    def __order_data(self, algorithm_run_order: AlgorithmRunOrder):
+        """ Orders the data of the given AlgorithmRunOrder at SYLVA Data Portal and notes the workspace id. """
+        if self.workspace_id is not None:
+            # data was ordered before the run was interrupted
+            response = json.dumps({"id": self.workspace_id})
+
+        elif (algorithm_run_order.dataset is not None):
+            # in case of dataset, a live workspace of another run is reused, otherwise API of SYLVA Data Portal is used
+            shared_workspace = self.__get_shared_workspace(algorithm_run_order.dataset)
+
+            if shared_workspace is not None:
+                self.log_repository.start_section(self.pid, RunSection.ORDER_DATA)
+                self.log_repository.append_log(self.pid, RunSection.ORDER_DATA, f"Reusing {shared_workspace['status']} workspace {shared_workspace['workspace']} of dataset {algorithm_run_order.dataset}.")
+                self.log_repository.end_section(self.pid, RunSection.ORDER_DATA, Status.SUCCESS)
+                response = json.dumps({"id": shared_workspace["workspace"]})
+
+            else:
+                self.data_workspace_claim = algorithm_run_order.dataset
+                try:
+                    self.__skip_if_preparation_failed()
+                    curl_command = ["curl", "-s", "-X", "POST", self.dataportal_configuration["workspace"], "-H", "Content-Type: application/json", "-d", json.dumps({"dataset": algorithm_run_order.dataset, "token": self.dataportal_configuration["token"]})]
+                    # working directory is emptied by the clone running meanwhile
+                    response = self.__run_and_log_section(RunSection.ORDER_DATA, curl_command, return_response_if_success=True, cwd=self.runner_configuration["path"])
+
+                    try:
+                        workspace_id = json.loads(response)["id"] if response != False else None
+                    except (ValueError, KeyError, TypeError):
+                        workspace_id = None
+
+                    if workspace_id is not None:
+                        ttl = timedelta(hours=self.dataportal_configuration.get("workspace-ttl-hours", 24))
+                        self.database_repository.register_data_workspace(algorithm_run_order.dataset, workspace_id, datetime.now(timezone.utc) + ttl)
+                        self.data_workspace_claim = None
+                finally:
+                    # runs waiting for the claim order the workspace themselves then
+                    self.__release_data_workspace_claim()
         
         elif (algorithm_run_order.localpath is not None):
             # in case of localpath, the data is already there, no workspace ID is needed as the given path is the final path to use
@@ -127,124 +273,362 @@ class AlgorithmRunner:
             # response might contain our workspace id if it was not False
             self.workspace_id = json.loads(response)["id"]
             self.log_repository.log_workspace_id(self.pid, self.workspace_id)
-        
 
 
+    def __get_shared_workspace(self, dataset: str) -> dict:
+        """ Returns the live workspace registered for the given dataset. Returns None if a new one is to be ordered by this run, which is claimed in this case. If another run is ordering the dataset right now, its workspace is awaited. """
+        deadline = time.monotonic() + self.workspace_claim_timeout
+
+        while True:
+            workspace = self.database_repository.get_live_data_workspace(dataset)
+
+            if workspace is not None:
+                # expiry in registry is a guess, the workspace may be gone at SYLVA Data Portal already
+                status = self.data_availability_poller.get_workspace_status(workspace["workspace"])
+                if status is not None:
+                    self.database_repository.update_data_workspace_status(workspace["workspace"], status)
+                    workspace["status"] = status
+
+                if workspace["status"] != "expired":
+                    return workspace
+
+                continue
+
+            claim_expires = datetime.now(timezone.utc) + timedelta(seconds=self.workspace_claim_timeout)
+            if self.database_repository.claim_data_workspace_order(dataset, self.pid, claim_expires) or time.monotonic() > deadline:
+                return None
+
+            time.sleep(self.workspace_claim_interval)
+
+
+    def __release_data_workspace_claim(self):
+        """ Gives up the claim of this run to order a workspace, if it still holds one as ordering failed or was stopped. """
+        dataset, self.data_workspace_claim = self.data_workspace_claim, None
+        if dataset is not None:
+            self.database_repository.release_data_workspace_claim(dataset, self.pid)
+
+
+    def __prepare_images(self, algorithm_run_order: AlgorithmRunOrder):
+        """ Clones the algorithm of the given AlgorithmRunOrder and provides algorithm docker image and run docker image, from image cache or by building them. """
         # Clone algorithm from foreign algorithm repository
-        clone_command = ["git", "clone", "-c", "advice.detachedHead=false", "--branch", f"{algorithm_run_order.algorithmVersion}", f"https://github.com/{algorithm_run_order.algorithmRepository}.git", f"{self.working_dir}"]
-        section_success = self.__run_and_log_section(RunSection.CLONE, clone_command)
+        if self.__is_completed(RunSection.CLONE) and len(os.listdir(self.working_dir)) > 0:
+            section_success = True
+        elif self.git_mirror is not None:
+            self.__skip_if_preparation_failed()
+            self.__reset_working_dir()
+            section_success = self.__clone_from_mirror(algorithm_run_order)
+        else:
+            self.__skip_if_preparation_failed()
+            self.__reset_working_dir()
+            clone_command = ["git", "clone", "-c", "advice.detachedHead=false", "--branch", f"{algorithm_run_order.algorithmVersion}", f"https://github.com/{algorithm_run_order.algorithmRepository}.git", f"{self.working_dir}"]
+            section_success = self.__run_and_log_section(RunSection.CLONE, clone_command)
         
         if not section_success:
             raise Exception()
         
 
 
-        # Build algorithm docker image
-        docker_build_algorithm_image = ["docker", "build", "-t", self.algorithm_docker_image_name, "."]
-        section_success = self.__run_and_log_section(RunSection.BUILD_ALGORITHM_IMAGE, docker_build_algorithm_image)
-        
+        # Images built before the run was interrupted
+        if self.__is_completed(RunSection.BUILD_ALGORITHM_RUN_IMAGE) and self.container_backend.image_exists(self.run_docker_image_name):
+            return
+
+        self.__skip_if_preparation_failed()
+
+        if self.image_cache is None:
+            self.__build_images()
+            return
+
+        # Reuse images built before for the same commit of the algorithm repository, a concurrent run building them is waited for
+        commit = subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=self.working_dir, text=True).strip()
+
+        with self.image_cache.lock(ImageCache.get_key(algorithm_run_order.algorithmRepository, commit)):
+            if self.__use_cached_images(algorithm_run_order, commit):
+                return
+
+            self.__skip_if_preparation_failed()
+            self.__build_images()
+
+            evicted_images = self.image_cache.add(self.image_cache_key, [self.algorithm_docker_image_name, self.run_docker_image_name], self.pid)
+            for evicted_image in evicted_images:
+                self.log_repository.append_log(self.pid, RunSection.BUILD_ALGORITHM_RUN_IMAGE, f"Evicted {evicted_image} from image cache.")
+
+
+    def __build_images(self):
+        """ Builds algorithm docker image and run docker image. """
+        if self.runner_configuration.get("buildkit", {}).get("enabled", False):
+            section_success = self.__build_images_single_pass()
+        else:
+            section_success = self.__build_images_separately()
+
         if not section_success:
             raise Exception()
+
+
+    def __build_images_separately(self) -> bool:
+        """ Builds algorithm docker image and run docker image in two builds. """
+        # Build algorithm docker image
+        if self.__is_completed(RunSection.BUILD_ALGORITHM_IMAGE) and self.container_backend.image_exists(self.algorithm_docker_image_name):
+            section_success = True
+        else:
+            section_success = self.__run_and_log_backend_section(RunSection.BUILD_ALGORITHM_IMAGE, lambda log: self.container_backend.build_image(self.algorithm_docker_image_name, self.working_dir, log))
         
+        if not section_success:
+            return False
 
+        self.__skip_if_preparation_failed()
 
-        # Build run docker image (based on algorithm docker image + own extension to make it work); Dockerfile for this is part of this package
-        with open('/var/lib/sylva-algorithm-runner/Dockerfile.template', 'r') as file:
-            dockerfile_template = file.read()
 
-        dockerfile_content = dockerfile_template.replace('{{pid}}', self.pid)
-        dockerfile_content = dockerfile_content.replace('{{workspaceId}}', self.workspace_id)
+        # Build run docker image (based on algorithm docker image + own extension to make it work); Dockerfile for this is part of this package
+        dockerfile_content = self.__read_dockerfile_template().replace('{{algorithmImage}}', self.algorithm_docker_image_name)
 
         with tempfile.TemporaryDirectory() as tmpdirname:
             with open(os.path.join(tmpdirname, "Dockerfile"), "w") as dockerfile:
                 dockerfile.write(dockerfile_content)
                 dockerfile.flush()
                 
-                docker_build_algorithm_run_image = ["docker", "build", "-t", self.run_docker_image_name, tmpdirname]
-                section_success = self.__run_and_log_section(RunSection.BUILD_ALGORITHM_RUN_IMAGE, docker_build_algorithm_run_image)
+                return self.__run_and_log_backend_section(RunSection.BUILD_ALGORITHM_RUN_IMAGE, lambda log: self.container_backend.build_image(self.run_docker_image_name, tmpdirname, log))
 
-        if not section_success:
-            raise Exception()       
-    
 
-    def __run_algorithm(self, workspace_path: str):
-        # Run the algorithm
-        
-        mountpoint = f"type=bind,source={workspace_path},destination=/data/workspace/,readonly"
-        docker_run = ["docker", "run", "--mount", mountpoint, "-d", "--name", self.algorithm_container_name, self.run_docker_image_name]
-        section_success = self.__run_and_log_section(RunSection.START_ALGORITHM, docker_run)
+    def __build_images_single_pass(self) -> bool:
+        """ Builds the run docker image in one BuildKit build by appending own extension of Dockerfile template to the algorithm's Dockerfile. Algorithm docker image name is tagged to the same image. Runs docker buildx directly, so it needs container backend cli. """
+        buildkit_configuration = self.runner_configuration["buildkit"]
 
-        if not section_success:
-            raise Exception()
-        
+        extension = [line for line in self.__read_dockerfile_template().splitlines() if not line.startswith("FROM ")]
+        with open(os.path.join(self.working_dir, "Dockerfile"), "r") as file:
+            dockerfile_content = file.read().rstrip() + "\n\n" + "\n".join(extension) + "\n"
+
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            dockerfile_path = os.path.join(tmpdirname, "Dockerfile")
+            with open(dockerfile_path, "w") as dockerfile:
+                dockerfile.write(dockerfile_content)
+
+            docker_build = ["docker", "buildx", "build", "--load", "--progress", "plain", "-f", dockerfile_path, "-t", self.algorithm_docker_image_name, "-t", self.run_docker_image_name]
+            for cache_from in buildkit_configuration.get("cache-from", []):
+                docker_build += ["--cache-from", cache_from]
+            if buildkit_configuration.get("cache-to") is not None:
+                docker_build += ["--cache-to", buildkit_configuration["cache-to"]]
+            docker_build.append(self.working_dir)
+
+            self.__skip_if_preparation_failed()
+
+            response = self.__run_and_log_section(RunSection.BUILD_ALGORITHM_IMAGE, docker_build, return_response_if_success=True)
+
+        if response == False:
+            return False
+
+        # report timings of build steps in the section they would have been built in by separate builds
+        extension_instructions = [line.rstrip("\\ ").strip() for line in extension if line.strip() != "" and not line.startswith(" ")]
+        self.log_repository.start_section(self.pid, RunSection.BUILD_ALGORITHM_RUN_IMAGE)
+        self.log_repository.append_log(self.pid, RunSection.BUILD_ALGORITHM_RUN_IMAGE, "Built in a single pass together with algorithm docker image.")
+
+        for step, timing in self.__get_build_step_timings(response):
+            run_section = RunSection.BUILD_ALGORITHM_RUN_IMAGE if any(instruction in step for instruction in extension_instructions) else RunSection.BUILD_ALGORITHM_IMAGE
+            self.log_repository.append_log(self.pid, run_section, f"Step {step}: {timing}")
+
+        self.log_repository.end_section(self.pid, RunSection.BUILD_ALGORITHM_RUN_IMAGE, Status.SUCCESS)
+        return True
+
+
+    @staticmethod
+    def __get_build_step_timings(build_output: str) -> list:
+        """ Returns name and duration of each step from plain progress output of BuildKit. """
+        step_names = {}
+        timings = []
+
+        for line in build_output.splitlines():
+            match = re.match(r"#(\d+) (\[.*\].*)$", line)
+            if match is not None:
+                step_names.setdefault(match.group(1), match.group(2))
+                continue
+
+            match = re.match(r"#(\d+) (DONE [\d.]+s|CACHED)$", line.strip())
+            if match is not None and match.group(1) in step_names:
+                timings.append((step_names[match.group(1)], match.group(2)))
+
+        return timings
+
+
+    @classmethod
+    def __read_dockerfile_template(cls) -> str:
+        with open(cls.dockerfile_template, 'r') as file:
+            return file.read()
+
+
+    def __clone_from_mirror(self, algorithm_run_order: AlgorithmRunOrder) -> bool:
+        """ Updates local mirror of the algorithm repository and clones the requested version from it. """
+        repository = algorithm_run_order.algorithmRepository
+
+        with self.git_mirror.lock(repository):
+            update_command = self.git_mirror.get_update_command(repository)
+            section_success = self.__run_and_log_section(RunSection.CLONE, update_command)
+
+            if not section_success and update_command[1] == "clone":
+                # do not leave a partial mirror behind
+                self.git_mirror.discard(repository)
 
-        
-        docker_logs = ["docker", "logs", "--follow", self.algorithm_container_name]
-        section_success = self.__run_and_log_section(RunSection.RUN_ALGORITHM, docker_logs)
         if not section_success:
-            raise Exception()
-        
+            return False
 
+        with self.git_mirror.lock(repository, shared=True):
+            clone_command = self.git_mirror.get_clone_command(repository, algorithm_run_order.algorithmVersion, self.working_dir)
+            return self.__run_and_log_section(RunSection.CLONE, clone_command)
 
-        # block until containers stop, then print exit codes which must be "0" for success
-        docker_wait = ["docker", "wait", self.algorithm_container_name]
-        section_success = self.__run_and_log_section(RunSection.WAIT_FOR_ALGORITHM, docker_wait, return_response_if_success=True)
-        
-        if section_success == False or section_success.strip() != "0":
-            # set status of RUN_ALGORITHM manually as __run_and_log_section is not able to detect the exit code
-            self.log_repository.end_section(self.pid, RunSection.RUN_ALGORITHM, Status.FAILURE)
-            raise Exception()
+
+    def __use_cached_images(self, algorithm_run_order: AlgorithmRunOrder, commit: str) -> bool:
+        """ Switches to image names of the given resolved commit and returns True if these images are in image cache already, so builds can be skipped. """
+        self.image_cache_key = ImageCache.get_key(algorithm_run_order.algorithmRepository, commit)
+        self.algorithm_docker_image_name, self.run_docker_image_name = ImageCache.get_image_names(algorithm_run_order.algorithmRepository, commit)
+        self.log_repository.log_images(self.pid, {"algorithm": self.algorithm_docker_image_name, "run": self.run_docker_image_name, "cacheKey": self.image_cache_key})
+
+        if not self.image_cache.lookup(self.image_cache_key, self.pid):
+            self.log_repository.append_log(self.pid, RunSection.BUILD_ALGORITHM_IMAGE, f"Image cache miss for {self.image_cache_key}.")
+            return False
+
+        for run_section, image in [(RunSection.BUILD_ALGORITHM_IMAGE, self.algorithm_docker_image_name), (RunSection.BUILD_ALGORITHM_RUN_IMAGE, self.run_docker_image_name)]:
+            self.log_repository.start_section(self.pid, run_section)
+            self.log_repository.append_log(self.pid, run_section, f"Image cache hit for {self.image_cache_key}, using {image}.")
+            self.log_repository.end_section(self.pid, run_section, Status.SUCCESS)
+
+        return True
+
+
+    def __run_algorithm(self, workspace_path: str, resources: dict = None):
+        # Run the algorithm
         
+        output_folder = os.path.join(self.runner_configuration['output'], self.pid)
+        mount_output = self.runner_configuration.get("output-mode", "copy") == "mount"
+
+        mounts = [{"source": os.path.join(workspace_path, self.workspace_id), "target": "/data/workspace/", "readonly": True}]
+        if mount_output:
+            # algorithm writes into output folder directly, no copy needed afterwards
+            os.makedirs(output_folder, exist_ok=True)
+            mounts.append({"source": output_folder, "target": "/data/output", "readonly": False})
+
+        # output was copied already if the run was interrupted afterwards
+        if not self.__is_completed(RunSection.COPY_OUTPUT):
+            self.__execute_algorithm(mounts, resources)
+
 
 
         # Get the results
-        output_folder = os.path.join(self.runner_configuration['output'], self.pid)
-        os.makedirs(output_folder)
-        copy_output = ["docker", "cp", f"{self.algorithm_container_name}:/data/output/.", output_folder]
-        section_success = self.__run_and_log_section(RunSection.COPY_OUTPUT, copy_output)
+        if self.__is_completed(RunSection.COPY_OUTPUT):
+            pass
+        elif mount_output:
+            self.log_repository.start_section(self.pid, RunSection.COPY_OUTPUT)
+            self.log_repository.append_log(self.pid, RunSection.COPY_OUTPUT, f"Output written to mounted folder {output_folder}, nothing to copy.")
+            self.log_repository.end_section(self.pid, RunSection.COPY_OUTPUT, Status.SUCCESS)
+        else:
+            # output of an interrupted copy is incomplete
+            shutil.rmtree(output_folder, ignore_errors=True)
+            os.makedirs(output_folder)
+            section_success = self.__run_and_log_backend_section(RunSection.COPY_OUTPUT, lambda log: self.container_backend.copy_from(self.algorithm_container_name, "/data/output", output_folder, log))
 
-        if not section_success:
-            raise Exception()
+            if not section_success:
+                raise Exception()
 
         # log the output files
-        file_list = []
-        for root, dirs, files in os.walk(output_folder):
-            for file in files:
-                file_path = os.path.join(root, file)
-                file_size = os.path.getsize(file_path)
-                file_info = {"fileName": file, "filePath": file_path[len(output_folder)+1:], "fileSize": file_size}
-                file_list.append(file_info)
-
+        file_list = OutputManifest.create(output_folder, self.runner_configuration.get("manifest-workers"))
         self.log_repository.log_output_files(self.pid, file_list)
 
         # last step: clean-up
+        if self.aborted:
+            raise Exception()
+
         section_success = self.__clean()
         self.log_repository.end_run(self.pid, Status.SUCCESS if section_success else Status.FAILURE)
         
         return section_success
 
 
+    def __execute_algorithm(self, mounts: list, resources: dict = None):
+        """ Starts the algorithm container, follows its output and waits for it to stop. If the run was interrupted after the container was started, it is attached to again. """
+        container_state = self.container_backend.get_container_state(self.algorithm_container_name)
+        since = None
+
+        if self.__is_completed(RunSection.START_ALGORITHM) and container_state is not None:
+            # output logged before the interruption is not logged again
+            last_timestamp = self.sections.get(RunSection.RUN_ALGORITHM.value, {}).get("lastTimestamp")
+            since = last_timestamp.timestamp() if last_timestamp is not None else None
+            self.log_repository.append_log(self.pid, RunSection.RUN_ALGORITHM, f"Attaching to {container_state} container {self.algorithm_container_name} again.")
+
+        else:
+            if container_state is not None:
+                # left behind by an interrupted start
+                self.__run_and_log_backend_section(RunSection.START_ALGORITHM, lambda log: self.container_backend.remove_container(self.algorithm_container_name, log))
+
+            section_success = self.__run_and_log_backend_section(RunSection.START_ALGORITHM, lambda log: self.container_backend.start(self.algorithm_container_name, self.run_docker_image_name, mounts, log, resources))
+
+            if not section_success:
+                raise Exception()
+        
+
+        
+        stats_sampler = None
+        if self.runner_configuration.get("stats-interval") is not None:
+            stats_sampler = ContainerStatsSampler(self.container_backend, self.algorithm_container_name, self.runner_configuration["stats-interval"])
+            stats_sampler.start()
+
+        try:
+            section_success = self.__run_and_log_backend_section(RunSection.RUN_ALGORITHM, lambda log: self.container_backend.follow_logs(self.algorithm_container_name, log, since))
+        finally:
+            resource_usage = stats_sampler.stop() if stats_sampler is not None else None
+            if resource_usage is not None:
+                self.log_repository.log_resource_usage(self.pid, resource_usage)
+
+        if not section_success:
+            raise Exception()
+        
+
+
+        # block until containers stop, exit code must be 0 for success
+        exit_code = self.__run_and_log_backend_section(RunSection.WAIT_FOR_ALGORITHM, lambda log: self.container_backend.wait(self.algorithm_container_name, log))
+        
+        if exit_code != 0:
+            # set status of RUN_ALGORITHM manually as following logs is not able to detect the exit code
+            self.log_repository.end_section(self.pid, RunSection.RUN_ALGORITHM, Status.FAILURE)
+            raise Exception()
+
+
     def __clean(self):
         """ Cleans up after running an algorithm. Removes the working directory and the docker images. """
-        remove_algorithm_container = ["docker", "rm", self.algorithm_container_name]
-        success3 = self.__run_and_log_section(RunSection.CLEANUP, remove_algorithm_container)
+        # container may have been removed before the run was interrupted
+        container_exists = self.container_backend.get_container_state(self.algorithm_container_name) is not None
+        success3 = self.__run_and_log_backend_section(RunSection.CLEANUP, lambda log: self.container_backend.remove_container(self.algorithm_container_name, log) if container_exists else True)
 
-        remove_algorithm_run_image = ["docker", "rmi", self.run_docker_image_name]
-        success2 = self.__run_and_log_section(RunSection.CLEANUP, remove_algorithm_run_image)
+        if self.image_cache is not None and self.image_cache_key is not None and self.image_cache.contains(self.image_cache_key):
+            # cached images are kept for next runs, they are removed by eviction only
+            self.image_cache.release(self.image_cache_key, self.pid)
+            self.log_repository.append_log(self.pid, RunSection.CLEANUP, f"Keeping cached images of {self.image_cache_key}.")
+            success1 = success2 = True
 
-        remove_algorithm_image = ["docker", "rmi", self.algorithm_docker_image_name]
-        success1 = self.__run_and_log_section(RunSection.CLEANUP, remove_algorithm_image)
+        else:
+            success2 = self.__run_and_log_backend_section(RunSection.CLEANUP, lambda log: self.container_backend.remove_image(self.run_docker_image_name, log))
+            success1 = self.__run_and_log_backend_section(RunSection.CLEANUP, lambda log: self.container_backend.remove_image(self.algorithm_docker_image_name, log))
                 
-        shutil.rmtree(self.working_dir)
+        shutil.rmtree(self.working_dir, ignore_errors=True)
 
         return success1 and success2 and success3
 
 
-    def __run_and_log_section(self, run_section: RunSection, command: list, return_response_if_success: bool = False):
-        """ Runs a command and logs the output to the given run_section in database. """
+    def __is_completed(self, run_section: RunSection) -> bool:
+        """ Returns True if the given section was completed successfully before this run was interrupted. """
+        return self.sections.get(run_section.value, {}).get("status") == Status.SUCCESS.value
+
+
+    def __reset_working_dir(self):
+        """ Empties the working directory, as a clone interrupted before may have left files. """
+        shutil.rmtree(self.working_dir, ignore_errors=True)
+        os.makedirs(self.working_dir)
+
+
+    def __run_and_log_section(self, run_section: RunSection, command: list, return_response_if_success: bool = False, cwd: str = None):
+        """ Runs a command (in working directory unless cwd is given) and logs the output to the given run_section in database. """
+        if self.aborted:
+            raise Exception()
+
         self.log_repository.start_section(self.pid, run_section)
         
-        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, universal_newlines=True, cwd=self.working_dir, bufsize=1)
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, universal_newlines=True, cwd=cwd if cwd is not None else self.working_dir, bufsize=1)
 
         response = ""
         for line in iter(process.stdout.readline, ""):
@@ -261,22 +645,40 @@ class AlgorithmRunner:
             return process.returncode == 0
 
 
+    def __run_and_log_backend_section(self, run_section: RunSection, action):
+        """ Runs the given container backend action and logs its output to the given run_section in database. Returns the result of the action. """
+        if self.aborted:
+            raise Exception()
+
+        self.log_repository.start_section(self.pid, run_section)
+
+        result = action(lambda line: self.log_repository.append_log(self.pid, run_section, line))
+
+        self.log_repository.end_section(self.pid, run_section, Status.FAILURE if result is None or result is False else Status.SUCCESS)
+        return result
+
+
     def __check_data_available(self) -> bool:
         """ Checks if the requested data is available. Returns True if it is, False otherwise. Raises an exception if the data is not available anymore. """
 
-        response = requests.get(f"https://data.sylva.bioaerosol.eu/api/workspace/{self.workspace_id}?token={self.dataportal_configuration['token']}")
+        # status of shared workspaces is known from registry if another run saw them provided already
+        if self.database_repository.get_data_workspace_status(self.workspace_id) == "provided":
+            self.log_repository.append_log(self.pid, RunSection.WAIT_FOR_DATA, "Data provided.")
+            return True
 
-        if response.status_code == 200:
-            data = response.json()
+        status = self.data_availability_poller.get_workspace_status(self.workspace_id)
 
-            if (data.get("status") == "expired"):
-                self.log_repository.append_log(self.pid, RunSection.WAIT_FOR_DATA, "Requested data is not available anymore.")
-                self.log_repository.end_section(self.pid, RunSection.WAIT_FOR_DATA, Status.FAILURE)
-                raise Exception()
-            
-            if data.get("status") == "provided":
-                self.log_repository.append_log(self.pid, RunSection.WAIT_FOR_DATA, "Data provided.")
-                return True
-            
+        if status is not None:
+            self.database_repository.update_data_workspace_status(self.workspace_id, status)
+
+        if (status == "expired"):
+            self.log_repository.append_log(self.pid, RunSection.WAIT_FOR_DATA, "Requested data is not available anymore.")
+            self.log_repository.end_section(self.pid, RunSection.WAIT_FOR_DATA, Status.FAILURE)
+            raise Exception()
+        
+        if status == "provided":
+            self.log_repository.append_log(self.pid, RunSection.WAIT_FOR_DATA, "Data provided.")
+            return True
+        
         self.log_repository.append_log(self.pid, RunSection.WAIT_FOR_DATA, "Requested data not available yet.")
         return False
\ No newline at end of file
@@ -0,0 +1,67 @@
+import threading
+import time
+
+from sylva_algorithm_runner.backends import ContainerBackend
+
+
+class ContainerStatsSampler:
+    """ Class to sample resource usage of a running algorithm container in a background thread. Once stopped it summarizes peak and average CPU and memory usage as well as block IO and network traffic of the container. """
+    interval = 5
+
+    def __init__(self, container_backend: ContainerBackend, container: str, interval: float = None) -> None:
+        self.container_backend = container_backend
+        self.container = container
+        if interval is not None:
+            self.interval = interval
+
+        self.__samples = []
+        self.__stopped = threading.Event()
+        self.__thread = threading.Thread(target=self.__sample_loop, name="container-stats", daemon=True)
+
+    def start(self):
+        self.__thread.start()
+
+    def stop(self) -> dict:
+        """ Stops sampling and returns the resource usage summary, None if no sample could be taken. """
+        self.__stopped.set()
+        if self.__thread.is_alive():
+            self.__thread.join()
+
+        return self.__summarize(self.__samples)
+
+    def __sample_loop(self):
+        while not self.__stopped.is_set():
+            try:
+                sample = self.container_backend.stats(self.container)
+            except Exception as e:
+                print(f"Could not sample stats of {self.container}: {e}")
+                sample = None
+
+            if sample is not None:
+                self.__samples.append((time.monotonic(), sample))
+
+            self.__stopped.wait(self.interval)
+
+    @staticmethod
+    def __summarize(samples: list) -> dict:
+        if len(samples) == 0:
+            return None
+
+        def peak_and_average(values: list) -> dict:
+            return {"peak": max(values), "average": sum(values) / len(values)}
+
+        usage = {
+            "samples": len(samples),
+            "cpuPercent": peak_and_average([sample["cpuPercent"] for _, sample in samples]),
+            "memoryBytes": peak_and_average([sample["memoryBytes"] for _, sample in samples])
+        }
+
+        # IO counters are cumulated by docker, rates are derived from consecutive samples
+        for counter, rate in [("blockReadBytes", "blockReadBytesPerSecond"), ("blockWriteBytes", "blockWriteBytesPerSecond"), ("networkReceivedBytes", "networkReceivedBytesPerSecond"), ("networkSentBytes", "networkSentBytesPerSecond")]:
+            usage[counter] = max(sample[counter] for _, sample in samples)
+
+            rates = [(current[counter] - previous[counter]) / (current_time - previous_time) for (previous_time, previous), (current_time, current) in zip(samples, samples[1:]) if current_time > previous_time]
+            if len(rates) > 0:
+                usage[rate] = {"peak": max(rates), "average": (samples[-1][1][counter] - samples[0][1][counter]) / (samples[-1][0] - samples[0][0])}
+
+        return usage
@@ -0,0 +1,74 @@
+import requests
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from requests.adapters import HTTPAdapter
+
+from sylva_algorithm_runner.repositories.DatabaseRepository import DatabaseRepository
+
+
+class DataAvailabilityPoller:
+    """ Class to check the workspaces of all runs waiting for data at once. Requests are sent concurrently over one pooled session and each workspace is checked with exponential backoff. Run orders are released for execution only once their data is provided (or expired, so the runner can fail the run). The status seen is noted in the workspace registry, so runs on the same dataset can reuse the workspace. """
+    initial_interval = 60
+    max_interval = 3600
+    workers = 8
+    timeout = 30
+
+    def __init__(self, dataportal_configuration: dict, database_repository: DatabaseRepository) -> None:
+        self.dataportal_configuration = dataportal_configuration
+        self.database_repository = database_repository
+
+        poll_configuration = self.dataportal_configuration.get("poll", {})
+        self.initial_interval = poll_configuration.get("initial-interval", self.initial_interval)
+        self.max_interval = poll_configuration.get("max-interval", self.max_interval)
+        self.workers = poll_configuration.get("workers", self.workers)
+        self.timeout = poll_configuration.get("timeout", self.timeout)
+
+        self.session = requests.Session()
+        self.session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=self.workers))
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=self.workers))
+
+    def poll(self) -> int:
+        """ Checks all workspaces which are due and returns the number of released run orders. """
+        now = datetime.now(timezone.utc)
+        runs = self.database_repository.get_runs_waiting_for_data(now)
+
+        if len(runs) == 0:
+            return 0
+
+        # several runs may wait for the same workspace, it is requested once only
+        workspace_ids = {run["workspace"] for run in runs}
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            statuses = dict(zip(workspace_ids, executor.map(self.get_workspace_status, workspace_ids)))
+
+        # runs waiting for the same workspace are released together, even those not due yet
+        released_count = 0
+        for workspace_id, status in statuses.items():
+            if status is not None:
+                self.database_repository.update_data_workspace_status(workspace_id, status)
+            if status in ["provided", "expired"]:
+                released_count += self.database_repository.release_runs_waiting_for_workspace(workspace_id, status, now + timedelta(seconds=self.initial_interval))
+
+        for run in runs:
+            status = statuses[run["workspace"]]
+
+            if status not in ["provided", "expired"]:
+                attempts = run.get("dataCheck", {}).get("attempts", 0) + 1
+                interval = min(self.max_interval, self.initial_interval * 2 ** (attempts - 1))
+                self.database_repository.postpone_data_check(run["_id"], status, attempts, now + timedelta(seconds=interval))
+
+        return released_count
+
+    def get_workspace_status(self, workspace_id: str) -> str:
+        """ Returns status of the given workspace as reported by SYLVA Data Portal, expired if it does not know the workspace and None if it could not be retrieved. """
+        try:
+            response = self.session.get(f"{self.dataportal_configuration['workspace']}/{workspace_id}", params={"token": self.dataportal_configuration["token"]}, timeout=self.timeout)
+            if response.status_code == 404:
+                return "expired"
+            if response.status_code == 200:
+                return response.json().get("status")
+        except (requests.RequestException, ValueError) as e:
+            print(f"Could not get status of workspace {workspace_id}: {e}")
+
+        return None
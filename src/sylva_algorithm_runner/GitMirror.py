@@ -0,0 +1,86 @@
+import fcntl
+import os
+import shutil
+import time
+
+from contextlib import contextmanager
+
+
+class GitMirror:
+    """ Class to keep bare mirrors of algorithm repositories on local machine. Mirrors are fetched incrementally and runs clone from them instead of GitHub. Access is serialized per repository by a lock file whose modification time also tracks last use. """
+    mirrors_path = None
+
+    def __init__(self, runner_path: str) -> None:
+        self.mirrors_path = os.path.join(runner_path, ".mirrors")
+
+
+    def get_mirror_path(self, repository: str) -> str:
+        return os.path.join(self.mirrors_path, f"{repository}.git")
+
+
+    def get_update_command(self, repository: str) -> list:
+        """ Returns command to create the mirror of the given repository or to fetch it if it exists already. """
+        mirror_path = self.get_mirror_path(repository)
+
+        if os.path.exists(os.path.join(mirror_path, "HEAD")):
+            return ["git", "--git-dir", mirror_path, "remote", "update", "--prune"]
+        else:
+            return ["git", "clone", "--mirror", f"https://github.com/{repository}.git", mirror_path]
+
+
+    def get_clone_command(self, repository: str, version: str, target_path: str) -> list:
+        """ Returns command to check out the given version from mirror into target path. Shallow, so the working copy does not depend on mirror afterwards. """
+        return ["git", "clone", "-c", "advice.detachedHead=false", "--depth", "1", "--branch", version, f"file://{self.get_mirror_path(repository)}", target_path]
+
+
+    def discard(self, repository: str):
+        """ Removes the mirror of the given repository, e.g. after it could not be created completely. Caller must hold the lock. """
+        shutil.rmtree(self.get_mirror_path(repository), ignore_errors=True)
+
+
+    @contextmanager
+    def lock(self, repository: str, shared: bool = False):
+        """ Locks the mirror of the given repository. Updates need an exclusive lock, clones from mirror can share it. """
+        lock_path = f"{self.get_mirror_path(repository)}.lock"
+        os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+
+        with open(lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            try:
+                os.utime(lock_path)
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+    def prune(self, max_age_days: float) -> list:
+        """ Removes mirrors not used for the given number of days. Mirrors currently in use are skipped. Returns the pruned repositories. """
+        pruned = []
+        if not os.path.isdir(self.mirrors_path):
+            return pruned
+
+        for root, dirs, files in os.walk(self.mirrors_path):
+            # do not descend into mirrors themselves
+            dirs[:] = [directory for directory in dirs if not directory.endswith(".git")]
+
+            for file in files:
+                if not file.endswith(".git.lock"):
+                    continue
+
+                lock_path = os.path.join(root, file)
+                if time.time() - os.path.getmtime(lock_path) < max_age_days * 86400:
+                    continue
+
+                with open(lock_path, "a") as lock_file:
+                    try:
+                        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        continue
+
+                    shutil.rmtree(lock_path[:-len(".lock")], ignore_errors=True)
+                    os.remove(lock_path)
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+                pruned.append(os.path.relpath(lock_path[:-len(".git.lock")], self.mirrors_path))
+
+        return pruned
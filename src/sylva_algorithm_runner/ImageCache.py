@@ -0,0 +1,139 @@
+import fcntl
+import hashlib
+import json
+import os
+import re
+import time
+
+from contextlib import contextmanager
+
+from sylva_algorithm_runner.backends import ContainerBackend
+
+
+class ImageCache:
+    """ Class to reuse algorithm docker images across runs. Images are tagged by algorithm repository and resolved commit, tracked in an index file on local machine and evicted least recently used first once the configured disk budget is exceeded. Images are inspected and removed through the given container backend. Images used by an unfinished run are pinned and never evicted. Runs of the same commit starting at the same time (e.g. children of a matrix run order) build its images once, the others wait for them. """
+    container_backend = None
+    index_file = None
+    lock_path = None
+    max_size = 0
+
+    def __init__(self, runner_path: str, cache_configuration: dict, container_backend: ContainerBackend) -> None:
+        self.container_backend = container_backend
+        self.index_file = os.path.join(runner_path, ".image-cache.json")
+        self.lock_path = os.path.join(runner_path, ".image-cache-locks")
+        self.max_size = int(cache_configuration.get("max-size-gb", 50) * 1024 ** 3)
+
+
+    @staticmethod
+    def get_key(repository: str, commit: str) -> str:
+        return f"{repository}@{commit}"
+
+
+    @staticmethod
+    def get_image_names(repository: str, commit: str) -> tuple:
+        """ Returns names of algorithm image and run image for the given repository and commit. """
+        path = "/".join(re.sub(r"[^a-z0-9._-]+", "-", part.lower()).strip("._-") for part in repository.split("/"))
+        return (f"sylva-algorithm/{path}:{commit}", f"sylva-algorithm-run/{path}:{commit}")
+
+
+    def lookup(self, key: str, pid: str) -> bool:
+        """ Returns True if images for the given key are cached. In this case the entry is marked as used and pinned for the given run. """
+        with self.__index() as index:
+            entry = index.get(key)
+            if entry is None or not all(self.container_backend.image_exists(image) for image in entry["images"]):
+                index.pop(key, None)
+                return False
+
+            entry["lastUsed"] = time.time()
+            entry["pinnedBy"] = sorted(set(entry["pinnedBy"]) | {pid})
+            return True
+
+
+    def add(self, key: str, images: list, pid: str) -> list:
+        """ Registers freshly built images for the given key, pinned for the given run. Evicts other entries if disk budget is exceeded and returns the evicted image names. """
+        with self.__index() as index:
+            index[key] = {"images": images, "size": sum(self.container_backend.get_image_size(image) or 0 for image in images), "lastUsed": time.time(), "pinnedBy": [pid]}
+            return self.__evict(index)
+
+
+    def contains(self, key: str) -> bool:
+        with self.__index() as index:
+            return key in index
+
+
+    def release(self, key: str, pid: str):
+        """ Removes the pin of the given run from the entry. """
+        with self.__index() as index:
+            if key in index:
+                index[key]["pinnedBy"] = [pinned_by for pinned_by in index[key]["pinnedBy"] if pinned_by != pid]
+
+
+    @contextmanager
+    def lock(self, key: str):
+        """ Locks building the images of the given key exclusively, to be held from lookup until the built images are added. """
+        os.makedirs(self.lock_path, exist_ok=True)
+
+        with open(os.path.join(self.lock_path, hashlib.sha1(key.encode()).hexdigest()), "a") as file:
+            fcntl.flock(file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(file, fcntl.LOCK_UN)
+
+
+    def get_pinning_runs(self) -> set:
+        """ Returns the ids of all runs pinning an entry. """
+        with self.__index() as index:
+            return {pinned_by for entry in index.values() for pinned_by in entry["pinnedBy"]}
+
+
+    def release_runs(self, pids: set):
+        """ Removes the pins of the given runs from all entries, e.g. as they crashed before releasing them. """
+        with self.__index() as index:
+            for entry in index.values():
+                entry["pinnedBy"] = [pinned_by for pinned_by in entry["pinnedBy"] if pinned_by not in pids]
+
+
+    def __evict(self, index: dict) -> list:
+        evicted = []
+        total_size = sum(entry["size"] for entry in index.values())
+
+        for key, entry in sorted(index.items(), key=lambda item: item[1]["lastUsed"]):
+            if total_size <= self.max_size:
+                break
+
+            if len(entry["pinnedBy"]) > 0:
+                continue
+
+            # run image is based on algorithm image, remove it first
+            for image in reversed(entry["images"]):
+                if self.container_backend.remove_image(image, lambda line: None):
+                    evicted.append(image)
+
+            total_size -= entry["size"]
+            del index[key]
+
+        return evicted
+
+
+    @contextmanager
+    def __index(self):
+        """ Opens the index exclusively locked, as several runs may use the cache concurrently, and writes it back afterwards. """
+        with open(self.index_file, "a+") as file:
+            fcntl.flock(file, fcntl.LOCK_EX)
+            try:
+                file.seek(0)
+                content = file.read()
+                try:
+                    index = json.loads(content) if content.strip() != "" else {}
+                except ValueError:
+                    index = {}
+
+                yield index
+
+                file.seek(0)
+                file.truncate()
+                json.dump(index, file)
+            finally:
+                fcntl.flock(file, fcntl.LOCK_UN)
+
@@ -0,0 +1,44 @@
+import hashlib
+import os
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+
+class OutputManifest:
+    """ Class to create the list of output files of an algorithm run with path, size, modification time and SHA-256 checksum. Files are hashed in parallel while the folder is walked once. """
+    chunk_size = 1024 * 1024
+
+    @staticmethod
+    def create(output_folder: str, workers: int = None) -> list:
+        """ Returns manifest entries of all files below the given output folder, sorted by file path. """
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(OutputManifest.__describe, output_folder, entry) for entry in OutputManifest.__scan(output_folder)]
+            return sorted([future.result() for future in futures], key=lambda file_info: file_info["filePath"])
+
+    @staticmethod
+    def __scan(folder: str):
+        """ Yields directory entries of all regular files below the given folder. Entries already carry stat results, so no further stat call is needed. """
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    yield from OutputManifest.__scan(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    yield entry
+
+    @staticmethod
+    def __describe(output_folder: str, entry: os.DirEntry) -> dict:
+        stat = entry.stat(follow_symlinks=False)
+
+        sha256 = hashlib.sha256()
+        with open(entry.path, "rb") as file:
+            for chunk in iter(lambda: file.read(OutputManifest.chunk_size), b""):
+                sha256.update(chunk)
+
+        return {
+            "fileName": entry.name,
+            "filePath": os.path.relpath(entry.path, output_folder),
+            "fileSize": stat.st_size,
+            "modified": datetime.fromtimestamp(stat.st_mtime, timezone.utc),
+            "sha256": sha256.hexdigest()
+        }
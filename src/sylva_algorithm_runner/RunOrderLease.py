@@ -0,0 +1,98 @@
+import os
+import socket
+import threading
+import uuid
+
+from datetime import datetime, timedelta, timezone
+
+from sylva_algorithm_runner.repositories.DatabaseRepository import DatabaseRepository
+
+
+class RunOrderLease:
+    """ Class to claim a run order before running it, so several hosts (or overlapping autostarts) never run the same run order. A claim is a lease in the run order document which takes one of runner.global-parallel global slots and one of runner.parallel slots of this host; unique indexes on the slots enforce both limits in database. While the run is active, a heartbeat renews the lease. Leases of crashed hosts expire and are reclaimed by the next claim. If the lease is lost nevertheless (e.g. the host was unreachable for longer than the lease lasts), on_lost is called to stop the run, as it may be resumed elsewhere. """
+    duration = 120
+    heartbeat_interval = 30
+    claim_attempts = 3
+    max_resumes = 3
+    resume_host_timeout = 3600
+
+    host = None
+    owner = None
+    run_order_id = None
+    on_lost = None
+
+    def __init__(self, runner_configuration: dict, database_repository: DatabaseRepository) -> None:
+        self.database_repository = database_repository
+        self.host_limit = runner_configuration["parallel"]
+        self.global_limit = runner_configuration.get("global-parallel")
+
+        lease_configuration = runner_configuration.get("lease", {})
+        self.duration = lease_configuration.get("duration", self.duration)
+        self.heartbeat_interval = lease_configuration.get("heartbeat-interval", self.heartbeat_interval)
+        self.resume_host_timeout = lease_configuration.get("resume-host-timeout", self.resume_host_timeout)
+        self.max_resumes = runner_configuration.get("max-resumes", self.max_resumes)
+
+        self.host = socket.gethostname()
+        self.owner = f"{self.host}/{os.getpid()}/{uuid.uuid4()}"
+
+        self.__stopped = threading.Event()
+        self.__thread = None
+
+    def get_free_slot_count(self) -> int:
+        """ Returns the number of runs this host may start now according to its own and the global limit. """
+        global_slots, host_slots = self.database_repository.get_active_lease_slots(self.host)
+
+        free_slot_count = self.host_limit - len(host_slots)
+        if self.global_limit is not None:
+            free_slot_count = min(free_slot_count, self.global_limit - len(global_slots))
+
+        return max(0, free_slot_count)
+
+    def claim(self, run_order_id: str, require_eligible: bool = True) -> bool:
+        """ Leases the given run order for this process and starts renewing the lease. Returns False if it is leased by someone else, not eligible (anymore, e.g. as it was run by another host meanwhile) or no slot is free. """
+        for reclaimed_id in self.database_repository.reclaim_expired_run_order_leases(self.max_resumes, self.resume_host_timeout):
+            print(f"Reclaimed expired lease of {reclaimed_id}.")
+
+        for _ in range(self.claim_attempts):
+            global_slots, host_slots = self.database_repository.get_active_lease_slots(self.host)
+
+            lease = {"owner": self.owner, "host": self.host, "expires": self.__get_expiry()}
+            lease["hostSlot"] = next((slot for slot in range(self.host_limit) if slot not in host_slots), None)
+            if self.global_limit is not None:
+                lease["globalSlot"] = next((slot for slot in range(self.global_limit) if slot not in global_slots), None)
+
+            if lease["hostSlot"] is None or lease.get("globalSlot", 0) is None:
+                return False
+
+            if self.database_repository.claim_run_order(run_order_id, lease, require_eligible):
+                self.run_order_id = run_order_id
+                self.__thread = threading.Thread(target=self.__heartbeat_loop, name="lease-heartbeat", daemon=True)
+                self.__thread.start()
+                return True
+
+            # slot taken by a concurrent claim or run order leased already, the latter fails again on retry
+        return False
+
+    def release(self):
+        """ Stops renewing and removes the lease, so its slots are free immediately. """
+        if self.run_order_id is None:
+            return
+
+        self.__stopped.set()
+        self.__thread.join()
+        self.database_repository.release_run_order_lease(self.run_order_id, self.owner)
+        self.run_order_id = None
+
+    def __heartbeat_loop(self):
+        while not self.__stopped.wait(self.heartbeat_interval):
+            try:
+                if not self.database_repository.renew_run_order_lease(self.run_order_id, self.owner, self.__get_expiry()):
+                    print(f"Lease of {self.run_order_id} was lost, another host may pick it up. Stopping the run.")
+                    if self.on_lost is not None:
+                        self.on_lost()
+                    return
+            except Exception as e:
+                print(f"Could not renew lease of {self.run_order_id}: {e}")
+
+    def __get_expiry(self) -> datetime:
+        return datetime.now(timezone.utc) + timedelta(seconds=self.duration)
@@ -0,0 +1,71 @@
+import os
+import re
+
+from sylva_algorithm_runner.ImageCache import ImageCache
+from sylva_algorithm_runner.RunOrderLease import RunOrderLease
+from sylva_algorithm_runner.backends import create_container_backend
+from sylva_algorithm_runner.repositories.DatabaseRepository import DatabaseRepository
+
+
+class RunRecovery:
+    """ Class to recover from crashed runs. Runs whose lease expired are marked INTERRUPTED, so they are picked up again and resumed by AlgorithmRunner at their first incomplete section. Containers and images of runs on local machine which are finished are removed, those of runs unknown to the database (e.g. of another deployment using the same docker daemon) are left untouched. Containers and images of interrupted runs are kept as they are needed to resume. Pins in the image cache of runs which do not use their images anymore are released, so the entries can be evicted. """
+    container_pattern = re.compile(r"^([0-9a-f]{24})-algorithm_container$")
+    image_pattern = re.compile(r"^([0-9a-f]{24})-(algorithm|run):latest$")
+
+    # runs in these statuses do not need their containers and images anymore
+    finished_statuses = ["SUCCESS", "FAILURE"]
+    # runs in these statuses use the cached images they pinned, runs waiting for data are continued without preparing images again
+    pinning_statuses = ["RUNNING", "WAITING_FOR_DATA"]
+
+    def __init__(self, runner_configuration: dict, database_repository: DatabaseRepository) -> None:
+        self.runner_configuration = runner_configuration
+        self.database_repository = database_repository
+        self.container_backend = create_container_backend(runner_configuration)
+
+    def recover(self) -> dict:
+        """ Reclaims expired leases and reaps orphaned containers and images. Returns reclaimed run order ids and removed containers and images. """
+        lease_configuration = self.runner_configuration.get("lease", {})
+        reclaimed = self.database_repository.reclaim_expired_run_order_leases(self.runner_configuration.get("max-resumes", RunOrderLease.max_resumes), lease_configuration.get("resume-host-timeout", RunOrderLease.resume_host_timeout))
+        containers, images = self.reap()
+
+        return {"reclaimed": reclaimed, "containers": containers, "images": images, "unpinned": self.release_image_cache_pins()}
+
+    def release_image_cache_pins(self) -> list:
+        """ Releases pins in the image cache of runs which are neither running nor waiting for data, e.g. as they crashed or were interrupted. Interrupted runs look their images up again when resumed. Returns the ids of these runs. """
+        image_cache = ImageCache(self.runner_configuration["path"], self.runner_configuration.get("image-cache", {}), self.container_backend)
+        # image cache is used by children of matrix run orders also if it is disabled
+        if not os.path.exists(image_cache.index_file):
+            return []
+
+        pinning_ids = image_cache.get_pinning_runs()
+        if len(pinning_ids) == 0:
+            return []
+
+        statuses = self.database_repository.get_algorithm_run_statuses(list(pinning_ids))
+        released_ids = sorted(run_id for run_id in pinning_ids if statuses.get(run_id) not in self.pinning_statuses)
+        image_cache.release_runs(set(released_ids))
+
+        return released_ids
+
+    def reap(self) -> tuple:
+        """ Removes containers and images named after runs which are finished. Returns the removed containers and images. """
+        containers = {name: self.container_pattern.match(name).group(1) for name in self.container_backend.list_containers() if self.container_pattern.match(name)}
+        images = {name: self.image_pattern.match(name).group(1) for name in self.container_backend.list_images() if self.image_pattern.match(name)}
+
+        run_ids = set(containers.values()) | set(images.values())
+        if len(run_ids) == 0:
+            return [], []
+
+        statuses = self.database_repository.get_algorithm_run_statuses(list(run_ids))
+        orphaned_ids = {run_id for run_id in run_ids if statuses.get(run_id) in self.finished_statuses}
+
+        removed_containers = [name for name, run_id in sorted(containers.items()) if run_id in orphaned_ids and self.container_backend.remove_container(name, self.__log)]
+
+        # run image is based on algorithm image, remove it first
+        removed_images = [name for name, run_id in sorted(images.items(), key=lambda item: (item[1], item[0].endswith("-algorithm:latest"))) if run_id in orphaned_ids and self.container_backend.remove_image(name, self.__log)]
+
+        return removed_containers, removed_images
+
+    @staticmethod
+    def __log(line: str):
+        print(line.rstrip("\n"))
@@ -2,4 +2,10 @@ __version__ = '0.0.1'
 
 from .YamlConfiguration import YamlConfiguration
 from .AlgorithmRunOrder import AlgorithmRunOrder, AlgorithmRunOrderStatus
-from .AlgorithmRunner import AlgorithmRunner, RunSection
\ No newline at end of file
+from .AlgorithmRunner import AlgorithmRunner, RunSection
+from .DataAvailabilityPoller import DataAvailabilityPoller
+from .AlgorithmRunScheduler import AlgorithmRunScheduler
+from .GitMirror import GitMirror
+from .RunOrderLease import RunOrderLease
+from .RunRecovery import RunRecovery
+from .ContainerStatsSampler import ContainerStatsSampler
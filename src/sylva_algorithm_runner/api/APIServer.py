@@ -1,39 +1,389 @@
+import io
 import os
+import socket
+import time
+import zipfile
 
-from . import JSONEncoder
-from bottle import Bottle, response, static_file, HTTPError
+from . import JSONEncoder, LRUCache
+from bottle import Bottle, request, response, static_file, http_date, parse_date, HTTPError, HTTPResponse
+from bson import ObjectId
+from datetime import datetime, timezone
 
-from sylva_algorithm_runner import YamlConfiguration
+from sylva_algorithm_runner import YamlConfiguration, RunSection
 from sylva_algorithm_runner.repositories import DatabaseRepository
 
 def dummyCallback():
     return { "response": "Hello World" }
 
+class ArchiveStream(io.RawIOBase):
+    """ Write-only stream collecting what an archive writer produces, so it can be handed out in chunks. Not seekable, which makes zipfile use data descriptors instead of rewriting headers. """
+    chunk_size = 1024 * 1024
+
+    def __init__(self) -> None:
+        self.__chunks = []
+        self.__position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.__chunks.append(bytes(data))
+        self.__position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.__position
+
+    def pop(self) -> bytes:
+        """ Returns and forgets everything written since last call. """
+        data = b"".join(self.__chunks)
+        self.__chunks = []
+        return data
+
+
 class APIServer:
     database_repository = None
     configuration = None
 
+    max_page_size = 1000
+    tail_interval = 1
+    tail_timeout = 300
+
+    # runs in these statuses never change anymore
+    finished_statuses = ["SUCCESS", "FAILURE"]
+    finished_max_age = 31536000
+
+    # upper bounds of section duration histogram buckets in seconds, waiting for data may take days
+    section_duration_bounds = [1, 5, 15, 60, 300, 900, 3600, 14400, 86400, 604800]
+    metrics_max_age = 30
+
     def __init__(self):
         self.configuration = YamlConfiguration("/etc/sylva-algorithm-runner/config.yaml")
         self.database_repository = DatabaseRepository(self.configuration.get("database"))
 
+        try:
+            cache_size = self.configuration.get("api", "cache-size")
+        except (KeyError, TypeError):
+            cache_size = None
+
+        self.finished_runs = LRUCache(cache_size)
+        self.run_manifests = LRUCache(cache_size)
+        self.metrics = None
+
     def __list_algorithm_run_orders(self):
-        return JSONEncoder().encode(self.database_repository.get_algorithm_run_orders_raw({ "_id": 1, "status": 1, "algorithm": 1, "algorithmRepository": 1, "algorithmVersion": 1, "dataset": 1 }))
+        filter, after, limit = self.__get_list_parameters(["status", "algorithm"])
+        return self.__encode_stream(self.database_repository.find_algorithm_run_orders_raw(filter, after, limit, { "_id": 1, "status": 1, "algorithm": 1, "algorithmRepository": 1, "algorithmVersion": 1, "dataset": 1, "matrix": 1, "parent": 1 }))
+
+    def __get_matrix_summary(self, run_order_id: str):
+        """ Returns a matrix run order with the number of its child run orders per status of their latest run. """
+        if not ObjectId.is_valid(run_order_id):
+            return HTTPError(404)
+
+        run_order = self.database_repository.get_algorithm_run_order_raw(run_order_id, { "_id": 1, "sourceId": 1, "algorithm": 1, "algorithmRepository": 1, "matrix": 1 })
+        if run_order is None or run_order.get("matrix") is None:
+            return HTTPError(404)
+
+        run_order["children"] = self.database_repository.count_matrix_children_by_status(run_order.pop("sourceId"))
+        return JSONEncoder().encode(run_order)
+
+    def __list_matrix_children(self, run_order_id: str):
+        if not ObjectId.is_valid(run_order_id):
+            return HTTPError(404)
+
+        run_order = self.database_repository.get_algorithm_run_order_raw(run_order_id, { "sourceId": 1, "matrix": 1 })
+        if run_order is None or run_order.get("matrix") is None:
+            return HTTPError(404)
+
+        filter, after, limit = self.__get_list_parameters(["latestRunStatus"])
+        filter["parent"] = run_order["sourceId"]
+        return self.__encode_stream(self.database_repository.find_algorithm_run_orders_raw(filter, after, limit, { "_id": 1, "status": 1, "algorithmVersion": 1, "dataset": 1, "localpath": 1, "latestRunStatus": 1 }))
     
     def __list_algorithm_runs(self, run_order_id: str):
-        return JSONEncoder().encode(self.database_repository.get_algorithm_runs_raw(run_order_id, { "_id": 1, "start": 1, "status": 1, "end": 1 }))
+        if not ObjectId.is_valid(run_order_id):
+            return HTTPError(404)
+
+        filter, after, limit = self.__get_list_parameters(["status"])
+        return self.__encode_stream(self.database_repository.find_algorithm_runs_raw(run_order_id, filter, after, limit, { "_id": 1, "start": 1, "status": 1, "end": 1 }))
+
+    def __get_list_parameters(self, filter_names: list) -> tuple:
+        """ Reads filter and keyset pagination parameters of list requests: limit, after (id of last item of previous page), from and to (unix timestamps) and the given filter names. """
+        filter = { name: request.query.get(name) for name in filter_names }
+
+        try:
+            for name in ["from", "to"]:
+                filter[name] = datetime.fromtimestamp(int(request.query.get(name)), timezone.utc) if request.query.get(name) is not None else None
+
+            limit = int(request.query.get("limit", 0))
+        except (ValueError, OverflowError):
+            raise HTTPError(400, "Parameters limit, from and to need to be integers.")
+
+        after = request.query.get("after")
+        if after is not None and not ObjectId.is_valid(after):
+            raise HTTPError(400, "Parameter after needs to be an id.")
+
+        if limit < 0 or limit > self.max_page_size:
+            raise HTTPError(400, f"Parameter limit needs to be between 1 and {self.max_page_size} (or 0 for no limit).")
+
+        return filter, after, limit
+
+    @staticmethod
+    def __encode_stream(cursor):
+        """ Encodes the documents of the given cursor as JSON array one by one, so they are never held in memory together. """
+        encoder = JSONEncoder()
+        yield "["
+
+        separator = ""
+        for document in cursor:
+            yield separator + encoder.encode(document)
+            separator = ","
+
+        yield "]"
     
     def __get_algorithm_run(self, run_order_id: str, run_id: str):
-        return JSONEncoder().encode(self.database_repository.get_algorithm_run_raw(run_order_id, run_id, { "_id": 1, "start": 1, "status": 1, "end": 1, "sections": 1, "outputFiles": 1 }))
+        finished_run = self.finished_runs.get((run_order_id, run_id))
+
+        if finished_run is None:
+            run = self.database_repository.get_algorithm_run_raw(run_order_id, run_id, { "_id": 1, "start": 1, "status": 1, "end": 1, "sections": 1, "outputFiles": 1, "resourceUsage": 1, "preparation": 1 })
+            body = JSONEncoder().encode(run)
+
+            if run is None or run.get("status") not in self.finished_statuses or run.get("end") is None:
+                response.set_header("Cache-Control", "no-cache")
+                return body
+
+            finished_run = { "etag": self.__get_etag(run_id, run), "lastModified": run["end"], "body": body }
+            self.finished_runs.put((run_order_id, run_id), finished_run)
+
+        return self.__respond_finished(finished_run["etag"], finished_run["lastModified"], lambda: finished_run["body"])
+
+    @staticmethod
+    def __get_etag(run_id: str, run: dict) -> str:
+        """ Returns a strong validator of a finished run, which is immutable once it has ended. """
+        return f'"{run_id}-{int(run["end"].timestamp() * 1000)}-{run["status"]}"'
+
+    def __respond_finished(self, etag: str, last_modified: datetime, get_body):
+        """ Answers conditional requests on a finished run with 304, otherwise returns the body. Responses may be cached for long. """
+        headers = {
+            "ETag": etag,
+            "Last-Modified": http_date(last_modified),
+            "Cache-Control": f"public, max-age={self.finished_max_age}, immutable"
+        }
+
+        if_none_match = request.get_header("If-None-Match")
+        if_modified_since = parse_date(request.get_header("If-Modified-Since", "").split(";")[0].strip()) if request.get_header("If-Modified-Since") is not None else None
+
+        if if_none_match is not None:
+            not_modified = if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]
+        else:
+            not_modified = if_modified_since is not None and if_modified_since >= int(last_modified.timestamp())
+
+        if not_modified:
+            return HTTPResponse(status=304, headers=headers)
+
+        for name, value in headers.items():
+            response.set_header(name, value)
+        return get_body()
+
+    def __get_section_log(self, run_order_id: str, run_id: str, section: str):
+        """ Returns log lines of one section, either starting at offset (number of lines already read) or newer than since (unix timestamp). Response contains count, to be used as offset of next request. """
+        offset, since = self.__get_log_parameters(run_order_id, run_id, section)
+
+        section_log = self.database_repository.get_section_log_raw(run_order_id, run_id, section, offset, since)
+        if section_log is None:
+            return HTTPError(404)
+
+        return JSONEncoder().encode(section_log)
+
+    def __tail_section_log(self, run_order_id: str, run_id: str, section: str):
+        """ Pushes new log lines of one section as Server-Sent Events until the section has ended. Event ids are line offsets, so a reconnecting client continues where it stopped. """
+        offset, _ = self.__get_log_parameters(run_order_id, run_id, section)
+        if request.get_header("Last-Event-ID") is not None and request.get_header("Last-Event-ID").isdigit():
+            offset = int(request.get_header("Last-Event-ID"))
+
+        section_log = self.database_repository.get_section_log_raw(run_order_id, run_id, section, offset)
+        if section_log is None:
+            return HTTPError(404)
+
+        response.content_type = "text/event-stream"
+        response.set_header("Cache-Control", "no-cache")
+
+        return self.__stream_section_log(run_order_id, run_id, section, offset, section_log)
+
+    def __stream_section_log(self, run_order_id: str, run_id: str, section: str, offset: int, section_log: dict):
+        encoder = JSONEncoder()
+        deadline = time.monotonic() + self.tail_timeout
+
+        while True:
+            # sequence numbers may have gaps (lines expired or never written), so offset follows the lines sent
+            for line in section_log["log"]:
+                offset = line["seq"] + 1
+                yield f"id: {offset}\ndata: {encoder.encode(line)}\n\n"
+
+            finished = section_log.get("end") is not None or section_log.get("runStatus") in ["SUCCESS", "FAILURE"]
+            if finished and (offset >= section_log["count"] or len(section_log["log"]) == 0):
+                yield f"event: end\ndata: {encoder.encode({'status': section_log.get('status')})}\n\n"
+                return
+
+            if time.monotonic() > deadline:
+                # client is expected to reconnect with Last-Event-ID
+                return
+
+            if len(section_log["log"]) == 0:
+                time.sleep(self.tail_interval)
+
+            section_log = self.database_repository.get_section_log_raw(run_order_id, run_id, section, offset)
+            if section_log is None:
+                return
+
+    def __get_log_parameters(self, run_order_id: str, run_id: str, section: str) -> tuple:
+        if section not in [run_section.value for run_section in RunSection] or not ObjectId.is_valid(run_order_id) or not ObjectId.is_valid(run_id):
+            raise HTTPError(404)
+
+        try:
+            offset = int(request.query.get("offset", 0))
+            since = datetime.fromtimestamp(float(request.query.get("since")), timezone.utc) if request.query.get("since") is not None else None
+        except (ValueError, OverflowError):
+            raise HTTPError(400, "Parameters offset and since need to be numbers.")
+
+        if offset < 0:
+            raise HTTPError(400, "Parameter offset must not be negative.")
+
+        return offset, since
 
     def __get_file(self, run_order_id: str, run_id: str, file_path: str):
-        has_file = self.database_repository.has_file(run_order_id, run_id, file_path)
-        if (has_file):
+        manifest = self.__get_run_manifest(run_order_id, run_id)
+
+        if manifest is not None and file_path in manifest["files"]:
             output_root = os.path.join(self.configuration.get("runner")["output"], run_id)
-            return static_file(file_path, root=output_root)
+
+            # a resumed download must not get a range of a file which changed meanwhile, entity tags are not supported
+            if_range = request.get_header("If-Range")
+            if if_range is not None:
+                if_range_date = parse_date(if_range)
+                try:
+                    modified = int(os.path.getmtime(os.path.join(output_root, file_path)))
+                except OSError:
+                    modified = None
+
+                if if_range_date is None or modified is None or modified > if_range_date:
+                    request.environ.pop("HTTP_RANGE", None)
+
+            file_response = static_file(file_path, root=output_root)
+
+            if manifest["finished"] and file_response.status_code in [200, 206]:
+                file_response.set_header("Cache-Control", f"public, max-age={self.finished_max_age}, immutable")
+            return file_response
         else:
             return HTTPError(404)
 
+    def __get_files_archive(self, run_order_id: str, run_id: str):
+        """ Streams all output files of a run as ZIP archive which is created on the fly. """
+        manifest = self.__get_run_manifest(run_order_id, run_id)
+        if manifest is None:
+            return HTTPError(404)
+
+        response.content_type = "application/zip"
+        response.set_header("Content-Disposition", f'attachment; filename="{run_id}.zip"')
+
+        output_root = os.path.join(self.configuration.get("runner")["output"], run_id)
+        return self.__stream_archive(output_root, sorted(manifest["files"]))
+
+    @staticmethod
+    def __stream_archive(output_root: str, file_paths: list):
+        stream = ArchiveStream()
+
+        with zipfile.ZipFile(stream, mode="w") as archive:
+            for file_path in file_paths:
+                path = os.path.join(output_root, file_path)
+                if not os.path.isfile(path):
+                    continue
+
+                # entries written via ZipInfo do not take compression of the archive
+                info = zipfile.ZipInfo.from_file(path, file_path)
+                info.compress_type = zipfile.ZIP_DEFLATED
+
+                with open(path, "rb") as source, archive.open(info, mode="w", force_zip64=True) as target:
+                    for chunk in iter(lambda: source.read(ArchiveStream.chunk_size), b""):
+                        target.write(chunk)
+                        yield stream.pop()
+
+                yield stream.pop()
+
+        # central directory is written on close
+        yield stream.pop()
+
+    def __get_run_manifest(self, run_order_id: str, run_id: str) -> dict:
+        """ Returns paths of all output files of the given run and whether the run is finished, None if no output files are known yet. Output files do not change once the run is finished, so manifests of finished runs are cached. """
+        manifest = self.run_manifests.get((run_order_id, run_id))
+        if manifest is not None:
+            return manifest
+
+        if not ObjectId.is_valid(run_order_id) or not ObjectId.is_valid(run_id):
+            return None
+
+        run = self.database_repository.get_algorithm_run_raw(run_order_id, run_id, { "status": 1, "end": 1, "outputFiles.filePath": 1 })
+        if run is None or "outputFiles" not in run:
+            return None
+
+        manifest = {
+            "files": { output_file["filePath"] for output_file in run["outputFiles"] },
+            "finished": run.get("status") in self.finished_statuses and run.get("end") is not None
+        }
+        if manifest["finished"]:
+            self.run_manifests.put((run_order_id, run_id), manifest)
+        return manifest
+
+    def __get_metrics(self):
+        """ Exposes run counts by status, run orders waiting for a slot, section durations and slot usage in Prometheus text format. Computed from database at most every metrics_max_age seconds. """
+        if self.metrics is None or time.monotonic() - self.metrics[0] > self.metrics_max_age:
+            self.metrics = (time.monotonic(), self.__create_metrics())
+
+        response.content_type = "text/plain; version=0.0.4; charset=utf-8"
+        return self.metrics[1]
+
+    def __create_metrics(self) -> str:
+        lines = []
+
+        def add(name: str, type: str, help: str, samples: list):
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {type}")
+            for suffix, labels, value in samples:
+                label_text = ",".join(f'{label}="{label_value}"' for label, label_value in labels.items())
+                lines.append(f"{name}{suffix}{{{label_text}}} {value}" if label_text != "" else f"{name}{suffix} {value}")
+
+        run_counts = self.database_repository.count_algorithm_runs_by_status()
+        add("sylva_algorithm_runs", "gauge", "Algorithm runs by status.", [("", {"status": status}, count) for status, count in sorted(run_counts.items(), key=lambda item: str(item[0]))])
+        add("sylva_algorithm_run_orders_queued", "gauge", "Run orders waiting for a free slot.", [("", {}, self.database_repository.count_eligible_run_orders())])
+
+        histogram_samples = []
+        for section, histogram in sorted(self.database_repository.get_section_duration_histograms(self.section_duration_bounds).items()):
+            for bound, count in zip(self.section_duration_bounds, histogram["buckets"]):
+                histogram_samples.append(("_bucket", {"section": section, "le": bound}, count))
+            histogram_samples.append(("_bucket", {"section": section, "le": "+Inf"}, histogram["count"]))
+            histogram_samples.append(("_sum", {"section": section}, histogram["sum"]))
+            histogram_samples.append(("_count", {"section": section}, histogram["count"]))
+        add("sylva_algorithm_run_section_duration_seconds", "histogram", "Duration of ended sections of algorithm runs.", histogram_samples)
+
+        # slots are taken by leases of run orders, runs waiting for data do not hold one; limits of other hosts are not known here
+        runner_configuration = self.configuration.get("runner")
+        leases_by_host = self.database_repository.count_active_leases_by_host()
+
+        slots = [("", {"scope": "host", "host": socket.gethostname()}, runner_configuration["parallel"])]
+        if runner_configuration.get("global-parallel") is not None:
+            slots.append(("", {"scope": "global"}, runner_configuration["global-parallel"]))
+        add("sylva_scheduler_slots", "gauge", "Runs allowed in parallel on this host and on all hosts together.", slots)
+
+        slots_used = [("", {"scope": "host", "host": host}, count) for host, count in sorted(leases_by_host.items(), key=lambda item: str(item[0]))]
+        slots_used.append(("", {"scope": "global"}, sum(leases_by_host.values())))
+        add("sylva_scheduler_slots_used", "gauge", "Slots taken by leases of run orders per host and on all hosts together.", slots_used)
+
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def __set_content_type():
+        # responses setting their own content type (event streams, archives) keep it, bottle defaults to text/html later
+        if "Content-Type" not in response.headers:
+            response.set_header("Content-Type", "application/json")
+
     def create_application(self, before_request_hook=None, after_request_hook=None):
         app = Bottle()
 
@@ -43,11 +393,17 @@ class APIServer:
         if after_request_hook is not None:
             app.add_hook("after_request", after_request_hook)
 
-        app.add_hook("after_request", lambda: response.set_header("Content-Type", "application/json"))
+        app.add_hook("after_request", self.__set_content_type)
 
+        app.route("/metrics", method="GET", callback=self.__get_metrics)
         app.route("/runOrders", method="GET", callback=self.__list_algorithm_run_orders)
+        app.route("/runOrders/<run_order_id>/matrix", method="GET", callback=self.__get_matrix_summary)
+        app.route("/runOrders/<run_order_id>/children", method="GET", callback=self.__list_matrix_children)
         app.route("/runOrders/<run_order_id>/runs", method="GET", callback=self.__list_algorithm_runs)
         app.route("/runOrders/<run_order_id>/runs/<run_id>", method="GET", callback=self.__get_algorithm_run)
+        app.route("/runOrders/<run_order_id>/runs/<run_id>/sections/<section>/log", method="GET", callback=self.__get_section_log)
+        app.route("/runOrders/<run_order_id>/runs/<run_id>/sections/<section>/log/stream", method="GET", callback=self.__tail_section_log)
+        app.route("/runOrders/<run_order_id>/runs/<run_id>/files.zip", method="GET", callback=self.__get_files_archive)
         app.route("/runOrders/<run_order_id>/runs/<run_id>/files/<file_path:path>", method="GET", callback=self.__get_file)
 
         return app
\ No newline at end of file
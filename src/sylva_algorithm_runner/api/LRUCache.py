@@ -0,0 +1,32 @@
+import threading
+
+from collections import OrderedDict
+from typing import Any
+
+
+class LRUCache():
+    """ Thread-safe in-process cache which drops the least recently used entry once its size is exceeded. """
+    size = 256
+
+    def __init__(self, size: int = None) -> None:
+        if size is not None:
+            self.size = size
+
+        self.__entries = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def get(self, key) -> Any:
+        with self.__lock:
+            if key not in self.__entries:
+                return None
+
+            self.__entries.move_to_end(key)
+            return self.__entries[key]
+
+    def put(self, key, value):
+        with self.__lock:
+            self.__entries[key] = value
+            self.__entries.move_to_end(key)
+
+            while len(self.__entries) > self.size:
+                self.__entries.popitem(last=False)
@@ -1,2 +1,3 @@
 from .JSONEncoder import JSONEncoder
+from .LRUCache import LRUCache
 from .APIServer import APIServer
\ No newline at end of file
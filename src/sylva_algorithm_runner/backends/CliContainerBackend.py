@@ -0,0 +1,113 @@
+import json
+import re
+import subprocess
+import typing
+
+from .ContainerBackend import ContainerBackend
+
+
+class CliContainerBackend(ContainerBackend):
+    """ Container backend forking the docker command line interface for each step. """
+
+    def build_image(self, image: str, context_path: str, log: typing.Callable[[str], None]) -> bool:
+        return self.__execute(["docker", "build", "-t", image, context_path], log)[0] == 0
+
+    def start(self, container: str, image: str, mounts: list, log: typing.Callable[[str], None], resources: dict = None) -> bool:
+        docker_run = ["docker", "run"]
+        for mount in mounts:
+            docker_run += ["--mount", f"type=bind,source={mount['source']},destination={mount['target']}" + (",readonly" if mount.get("readonly", False) else "")]
+        if resources is not None and resources.get("cpus") is not None:
+            docker_run += ["--cpus", str(resources["cpus"])]
+        if resources is not None and resources.get("memory") is not None:
+            docker_run += ["--memory", f"{resources['memory']}b"]
+        docker_run += ["-d", "--name", container, image]
+
+        return self.__execute(docker_run, log)[0] == 0
+
+    def follow_logs(self, container: str, log: typing.Callable[[str], None], since: float = None) -> bool:
+        docker_logs = ["docker", "logs", "--follow"]
+        if since is not None:
+            docker_logs += ["--since", f"{since:.9f}"]
+
+        return self.__execute(docker_logs + [container], log)[0] == 0
+
+    def wait(self, container: str, log: typing.Callable[[str], None]) -> typing.Optional[int]:
+        returncode, output = self.__execute(["docker", "wait", container], log)
+
+        try:
+            return int(output.strip()) if returncode == 0 else None
+        except ValueError:
+            return None
+
+    def copy_from(self, container: str, source_path: str, target_path: str, log: typing.Callable[[str], None]) -> bool:
+        return self.__execute(["docker", "cp", f"{container}:{source_path}/.", target_path], log)[0] == 0
+
+    def stats(self, container: str) -> typing.Optional[dict]:
+        process = subprocess.run(["docker", "stats", "--no-stream", "--format", "{{json .}}", container], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        if process.returncode != 0:
+            return None
+
+        try:
+            content = json.loads(process.stdout)
+            block_read, block_write = content["BlockIO"].split(" / ")
+            network_received, network_sent = content["NetIO"].split(" / ")
+
+            return {
+                "cpuPercent": float(content["CPUPerc"].rstrip("%")),
+                "memoryBytes": self.__parse_size(content["MemUsage"].split(" / ")[0]),
+                "blockReadBytes": self.__parse_size(block_read),
+                "blockWriteBytes": self.__parse_size(block_write),
+                "networkReceivedBytes": self.__parse_size(network_received),
+                "networkSentBytes": self.__parse_size(network_sent)
+            }
+        except (ValueError, KeyError):
+            return None
+
+    def remove_container(self, container: str, log: typing.Callable[[str], None], force: bool = False) -> bool:
+        return self.__execute(["docker", "rm"] + (["-f"] if force else []) + [container], log)[0] == 0
+
+    def remove_image(self, image: str, log: typing.Callable[[str], None]) -> bool:
+        return self.__execute(["docker", "rmi", image], log)[0] == 0
+
+    def get_container_state(self, container: str) -> typing.Optional[str]:
+        process = subprocess.run(["docker", "container", "inspect", "--format", "{{.State.Status}}", container], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        return process.stdout.strip() if process.returncode == 0 else None
+
+    def image_exists(self, image: str) -> bool:
+        return subprocess.run(["docker", "image", "inspect", image], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode == 0
+
+    def get_image_size(self, image: str) -> typing.Optional[int]:
+        process = subprocess.run(["docker", "image", "inspect", "--format", "{{.Size}}", image], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        try:
+            return int(process.stdout.strip()) if process.returncode == 0 else None
+        except ValueError:
+            return None
+
+    def list_containers(self) -> list:
+        return subprocess.check_output(["docker", "ps", "--all", "--format", "{{.Names}}"], text=True).split()
+
+    def list_images(self) -> list:
+        return [image for image in subprocess.check_output(["docker", "images", "--format", "{{.Repository}}:{{.Tag}}"], text=True).split() if "<none>" not in image]
+
+    @staticmethod
+    def __parse_size(size: str) -> int:
+        """ Converts sizes as printed by docker stats (e.g. 1.5GiB, 12.3MB, 0B) to bytes. """
+        match = re.fullmatch(r"([\d.]+)\s*([kKMGTP]?)(i?)B", size.strip())
+        if match is None:
+            raise ValueError(f"Unknown size {size}")
+
+        number, prefix, binary = match.groups()
+        return int(float(number) * (1024 if binary else 1000) ** " KMGTP".index(prefix.upper() or " "))
+
+    @staticmethod
+    def __execute(command: list, log: typing.Callable[[str], None]) -> tuple:
+        """ Runs the given command, passes each output line to log and returns exit code and complete output. """
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, universal_newlines=True, bufsize=1)
+
+        output = ""
+        for line in iter(process.stdout.readline, ""):
+            output += line
+            log(line)
+
+        process.communicate()
+        return process.returncode, output
@@ -0,0 +1,69 @@
+import typing
+
+from abc import ABC, abstractmethod
+
+
+class ContainerBackend(ABC):
+    """ Interface of the backends used by AlgorithmRunner to build images and to run, follow, wait for and remove containers. Each method gets a callback to log output lines to and returns False (or None for wait) on failure. """
+
+    @abstractmethod
+    def build_image(self, image: str, context_path: str, log: typing.Callable[[str], None]) -> bool:
+        """ Builds the given image from the Dockerfile in context path. """
+        pass
+
+    @abstractmethod
+    def start(self, container: str, image: str, mounts: list, log: typing.Callable[[str], None], resources: dict = None) -> bool:
+        """ Creates and starts a detached container of the given image. Mounts are given as dicts with source, target and readonly. Optional resources (cpus, memory in bytes) limit the container. """
+        pass
+
+    @abstractmethod
+    def follow_logs(self, container: str, log: typing.Callable[[str], None], since: float = None) -> bool:
+        """ Streams output of the given container until it stops, optionally output since the given unix timestamp only. """
+        pass
+
+    @abstractmethod
+    def wait(self, container: str, log: typing.Callable[[str], None]) -> typing.Optional[int]:
+        """ Blocks until the given container stops and returns its exit code. """
+        pass
+
+    @abstractmethod
+    def copy_from(self, container: str, source_path: str, target_path: str, log: typing.Callable[[str], None]) -> bool:
+        """ Copies content of source path in container into target path on local machine. """
+        pass
+
+    def stats(self, container: str) -> typing.Optional[dict]:
+        """ Returns one sample of resource usage of the given running container with cpuPercent, memoryBytes and the cumulated blockReadBytes, blockWriteBytes, networkReceivedBytes and networkSentBytes. Returns None if not available. """
+        return None
+
+    @abstractmethod
+    def remove_container(self, container: str, log: typing.Callable[[str], None], force: bool = False) -> bool:
+        """ Removes the given container, if forced even while it is running. """
+        pass
+
+    @abstractmethod
+    def remove_image(self, image: str, log: typing.Callable[[str], None]) -> bool:
+        pass
+
+    @abstractmethod
+    def get_container_state(self, container: str) -> typing.Optional[str]:
+        """ Returns the state of the given container as docker names it (e.g. created, running, exited), None if it does not exist. """
+        pass
+
+    @abstractmethod
+    def image_exists(self, image: str) -> bool:
+        pass
+
+    @abstractmethod
+    def get_image_size(self, image: str) -> typing.Optional[int]:
+        """ Returns the size of the given image in bytes, None if it does not exist. """
+        pass
+
+    @abstractmethod
+    def list_containers(self) -> list:
+        """ Returns the names of all containers, running or not. """
+        pass
+
+    @abstractmethod
+    def list_images(self) -> list:
+        """ Returns the names (repository:tag) of all images. """
+        pass
@@ -0,0 +1,254 @@
+import http.client
+import json
+import os
+import socket
+import struct
+import tarfile
+import tempfile
+import typing
+
+from urllib.parse import quote, urlencode
+
+from .ContainerBackend import ContainerBackend
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """ HTTP connection over a Unix domain socket as used by Docker Engine. """
+
+    def __init__(self, socket_path: str, timeout: float = None) -> None:
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if self.timeout is not None:
+            self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+class DockerSocketContainerBackend(ContainerBackend):
+    """ Container backend talking to Docker Engine API on its socket directly instead of forking the docker command line interface. """
+    socket_path = "/var/run/docker.sock"
+    api_version = "v1.41"
+
+    def __init__(self, socket_path: str = None) -> None:
+        if socket_path is not None:
+            self.socket_path = socket_path
+
+    def build_image(self, image: str, context_path: str, log: typing.Callable[[str], None]) -> bool:
+        with tempfile.TemporaryFile() as context:
+            with tarfile.open(fileobj=context, mode="w") as tar:
+                tar.add(context_path, arcname=".")
+            context.seek(0)
+
+            connection, response = self.__request("POST", "/build", {"t": image, "rm": 1}, body=context, headers={"Content-Type": "application/x-tar"})
+            try:
+                if response.status != 200:
+                    return self.__log_error(response, log)
+
+                # build progress is streamed as JSON objects, one per line
+                success = True
+                for line in response:
+                    if line.strip() == b"":
+                        continue
+
+                    message = json.loads(line)
+                    if "stream" in message:
+                        log(message["stream"])
+                    if "error" in message:
+                        log(message["error"])
+                        success = False
+                return success
+            finally:
+                connection.close()
+
+    def start(self, container: str, image: str, mounts: list, log: typing.Callable[[str], None], resources: dict = None) -> bool:
+        create_body = {
+            "Image": image,
+            "HostConfig": {
+                "Mounts": [{"Type": "bind", "Source": mount["source"], "Target": mount["target"], "ReadOnly": mount.get("readonly", False)} for mount in mounts]
+            }
+        }
+        if resources is not None and resources.get("cpus") is not None:
+            create_body["HostConfig"]["NanoCpus"] = int(resources["cpus"] * 1e9)
+        if resources is not None and resources.get("memory") is not None:
+            create_body["HostConfig"]["Memory"] = resources["memory"]
+
+        status, content = self.__call("POST", "/containers/create", {"name": container}, create_body)
+        if status != 201:
+            log(content.get("message", f"Creating container failed with status {status}."))
+            return False
+
+        log(content["Id"])
+
+        status, content = self.__call("POST", f"/containers/{quote(container)}/start")
+        if status not in [204, 304]:
+            log(content.get("message", f"Starting container failed with status {status}."))
+            return False
+
+        return True
+
+    def follow_logs(self, container: str, log: typing.Callable[[str], None], since: float = None) -> bool:
+        query = {"follow": 1, "stdout": 1, "stderr": 1}
+        if since is not None:
+            query["since"] = f"{since:.9f}"
+
+        connection, response = self.__request("GET", f"/containers/{quote(container)}/logs", query)
+        try:
+            if response.status != 200:
+                return self.__log_error(response, log)
+
+            # containers without TTY multiplex stdout and stderr in frames with an 8 byte header
+            pending = b""
+            while True:
+                header = response.read(8)
+                if len(header) < 8:
+                    break
+
+                _, size = struct.unpack(">BxxxL", header)
+                pending += response.read(size)
+
+                *lines, pending = pending.split(b"\n")
+                for line in lines:
+                    log(line.decode(errors="replace") + "\n")
+
+            if pending != b"":
+                log(pending.decode(errors="replace"))
+
+            return True
+        finally:
+            connection.close()
+
+    def wait(self, container: str, log: typing.Callable[[str], None]) -> typing.Optional[int]:
+        status, content = self.__call("POST", f"/containers/{quote(container)}/wait")
+        if status != 200:
+            log(content.get("message", f"Waiting for container failed with status {status}."))
+            return None
+
+        log(f"{content['StatusCode']}\n")
+        return content["StatusCode"]
+
+    def copy_from(self, container: str, source_path: str, target_path: str, log: typing.Callable[[str], None]) -> bool:
+        connection, response = self.__request("GET", f"/containers/{quote(container)}/archive", {"path": source_path})
+        try:
+            if response.status != 200:
+                return self.__log_error(response, log)
+
+            # archive contains source directory itself as root, only its content is extracted
+            with tarfile.open(fileobj=response, mode="r|") as tar:
+                for member in tar:
+                    name = os.path.normpath(member.name).split(os.sep, 1)
+                    if len(name) < 2 or name[1].startswith("..") or os.path.isabs(name[1]):
+                        continue
+                    if not (member.isfile() or member.isdir()):
+                        log(f"Skipping {member.name} as it is not a regular file or directory.\n")
+                        continue
+
+                    member.name = name[1]
+                    tar.extract(member, target_path, set_attrs=False)
+
+            return True
+        finally:
+            connection.close()
+
+    def stats(self, container: str) -> typing.Optional[dict]:
+        status, content = self.__call("GET", f"/containers/{quote(container)}/stats", {"stream": 0})
+        if status != 200 or not content.get("memory_stats"):
+            return None
+
+        # same calculation as docker stats
+        cpu_stats = content.get("cpu_stats", {})
+        precpu_stats = content.get("precpu_stats", {})
+        cpu_delta = cpu_stats.get("cpu_usage", {}).get("total_usage", 0) - precpu_stats.get("cpu_usage", {}).get("total_usage", 0)
+        system_delta = cpu_stats.get("system_cpu_usage", 0) - precpu_stats.get("system_cpu_usage", 0)
+        online_cpus = cpu_stats.get("online_cpus") or len(cpu_stats.get("cpu_usage", {}).get("percpu_usage") or [1])
+
+        memory_stats = content["memory_stats"]
+        memory_cache = memory_stats.get("stats", {}).get("inactive_file", memory_stats.get("stats", {}).get("total_inactive_file", 0))
+
+        block_io = content.get("blkio_stats", {}).get("io_service_bytes_recursive") or []
+        networks = (content.get("networks") or {}).values()
+
+        return {
+            "cpuPercent": cpu_delta / system_delta * online_cpus * 100 if system_delta > 0 and cpu_delta > 0 else 0.0,
+            "memoryBytes": max(0, memory_stats.get("usage", 0) - memory_cache),
+            "blockReadBytes": sum(entry["value"] for entry in block_io if entry.get("op", "").lower() == "read"),
+            "blockWriteBytes": sum(entry["value"] for entry in block_io if entry.get("op", "").lower() == "write"),
+            "networkReceivedBytes": sum(network.get("rx_bytes", 0) for network in networks),
+            "networkSentBytes": sum(network.get("tx_bytes", 0) for network in networks)
+        }
+
+    def remove_container(self, container: str, log: typing.Callable[[str], None], force: bool = False) -> bool:
+        status, content = self.__call("DELETE", f"/containers/{quote(container)}" + ("?force=1" if force else ""))
+        if status != 204:
+            log(content.get("message", f"Removing container failed with status {status}."))
+            return False
+
+        log(f"{container}\n")
+        return True
+
+    def remove_image(self, image: str, log: typing.Callable[[str], None]) -> bool:
+        status, content = self.__call("DELETE", f"/images/{quote(image, safe='/:')}")
+        if status != 200:
+            log(content.get("message", f"Removing image failed with status {status}."))
+            return False
+
+        for entry in content:
+            for action, reference in entry.items():
+                log(f"{action}: {reference}\n")
+        return True
+
+    def get_container_state(self, container: str) -> typing.Optional[str]:
+        status, content = self.__call("GET", f"/containers/{quote(container)}/json")
+        return content["State"]["Status"] if status == 200 else None
+
+    def image_exists(self, image: str) -> bool:
+        return self.__call("GET", f"/images/{quote(image, safe='/:')}/json")[0] == 200
+
+    def get_image_size(self, image: str) -> typing.Optional[int]:
+        status, content = self.__call("GET", f"/images/{quote(image, safe='/:')}/json")
+        return content.get("Size", 0) if status == 200 else None
+
+    def list_containers(self) -> list:
+        status, content = self.__call("GET", "/containers/json", {"all": 1})
+        if status != 200:
+            raise IOError(f"Listing containers failed with status {status}.")
+
+        return [name.lstrip("/") for entry in content for name in entry.get("Names") or []]
+
+    def list_images(self) -> list:
+        status, content = self.__call("GET", "/images/json")
+        if status != 200:
+            raise IOError(f"Listing images failed with status {status}.")
+
+        return [tag for entry in content for tag in entry.get("RepoTags") or [] if "<none>" not in tag]
+
+    def __request(self, method: str, path: str, query: dict = None, body: typing.Any = None, headers: dict = None) -> tuple:
+        """ Sends a request and returns connection and response. Caller needs to close connection after reading the response. """
+        url = f"/{self.api_version}{path}" + (f"?{urlencode(query)}" if query else "")
+        headers = headers if headers is not None else {}
+
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode()
+            headers["Content-Type"] = "application/json"
+
+        connection = UnixHTTPConnection(self.socket_path)
+        connection.request(method, url, body=body, headers=headers)
+        return connection, connection.getresponse()
+
+    def __call(self, method: str, path: str, query: dict = None, body: typing.Any = None) -> tuple:
+        """ Sends a request and returns status and decoded JSON content. """
+        connection, response = self.__request(method, path, query, body)
+        try:
+            content = response.read()
+            return response.status, json.loads(content) if content.strip() != b"" else {}
+        finally:
+            connection.close()
+
+    @staticmethod
+    def __log_error(response: http.client.HTTPResponse, log: typing.Callable[[str], None]) -> bool:
+        try:
+            log(json.loads(response.read()).get("message", f"Request failed with status {response.status}."))
+        except ValueError:
+            log(f"Request failed with status {response.status}.")
+        return False
@@ -0,0 +1,98 @@
+import os
+import time
+import typing
+
+from .ContainerBackend import ContainerBackend
+
+
+class FakeContainerBackend(ContainerBackend):
+    """ Container backend that does not need Docker. Builds and starts succeed immediately, a started container writes the configured number of log lines, exits with the configured exit code and provides the configured output files. Used to test and benchmark the runner itself. """
+    log_lines = 100
+    line_interval = 0.0
+    exit_code = 0
+    output_files = {}
+
+    def __init__(self, fake_configuration: dict = None) -> None:
+        fake_configuration = fake_configuration if fake_configuration is not None else {}
+
+        self.log_lines = fake_configuration.get("log-lines", self.log_lines)
+        self.line_interval = fake_configuration.get("line-interval", self.line_interval)
+        self.exit_code = fake_configuration.get("exit-code", self.exit_code)
+        self.output_files = fake_configuration.get("output-files", self.output_files)
+
+        self.images = set()
+        self.containers = set()
+
+    def build_image(self, image: str, context_path: str, log: typing.Callable[[str], None]) -> bool:
+        self.images.add(image)
+        log(f"Successfully tagged {image}\n")
+        return True
+
+    def start(self, container: str, image: str, mounts: list, log: typing.Callable[[str], None], resources: dict = None) -> bool:
+        if image not in self.images or container in self.containers:
+            log(f"Cannot start {container} from {image}.\n")
+            return False
+
+        self.containers.add(container)
+        log(f"{container}\n")
+        return True
+
+    def follow_logs(self, container: str, log: typing.Callable[[str], None], since: float = None) -> bool:
+        for index in range(self.log_lines):
+            log(f"{container} log line {index}\n")
+            if self.line_interval > 0:
+                time.sleep(self.line_interval)
+        return container in self.containers
+
+    def wait(self, container: str, log: typing.Callable[[str], None]) -> typing.Optional[int]:
+        if container not in self.containers:
+            return None
+
+        log(f"{self.exit_code}\n")
+        return self.exit_code
+
+    def copy_from(self, container: str, source_path: str, target_path: str, log: typing.Callable[[str], None]) -> bool:
+        # output files are given as relative path and size in bytes
+        for file_path, file_size in self.output_files.items():
+            path = os.path.join(target_path, file_path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as file:
+                file.write(os.urandom(file_size))
+        return container in self.containers
+
+    def stats(self, container: str) -> typing.Optional[dict]:
+        if container not in self.containers:
+            return None
+
+        return {"cpuPercent": 0.0, "memoryBytes": 0, "blockReadBytes": 0, "blockWriteBytes": 0, "networkReceivedBytes": 0, "networkSentBytes": 0}
+
+    def remove_container(self, container: str, log: typing.Callable[[str], None], force: bool = False) -> bool:
+        # fake containers have exited as soon as they are started, so they are removed with or without force
+        if container not in self.containers:
+            return False
+
+        self.containers.remove(container)
+        return True
+
+    def remove_image(self, image: str, log: typing.Callable[[str], None]) -> bool:
+        if image not in self.images:
+            return False
+
+        self.images.remove(image)
+        return True
+
+    def get_container_state(self, container: str) -> typing.Optional[str]:
+        # fake containers have written their output as soon as they are started
+        return "exited" if container in self.containers else None
+
+    def image_exists(self, image: str) -> bool:
+        return image in self.images
+
+    def get_image_size(self, image: str) -> typing.Optional[int]:
+        return 0 if image in self.images else None
+
+    def list_containers(self) -> list:
+        return sorted(self.containers)
+
+    def list_images(self) -> list:
+        return sorted(self.images)
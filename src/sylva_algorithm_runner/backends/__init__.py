@@ -0,0 +1,19 @@
+from .ContainerBackend import ContainerBackend
+from .CliContainerBackend import CliContainerBackend
+from .DockerSocketContainerBackend import DockerSocketContainerBackend
+from .FakeContainerBackend import FakeContainerBackend
+
+
+def create_container_backend(runner_configuration: dict) -> ContainerBackend:
+    """ Returns the container backend selected by runner.container-backend (cli, socket or fake). Raises ValueError if runner.buildkit is enabled with another backend than cli, as single pass builds need docker buildx. """
+    backend = runner_configuration.get("container-backend", "cli")
+
+    if runner_configuration.get("buildkit", {}).get("enabled", False) and backend != "cli":
+        raise ValueError(f"runner.buildkit needs container backend cli, not {backend}")
+
+    if backend == "socket":
+        return DockerSocketContainerBackend(runner_configuration.get("docker-socket"))
+    elif backend == "fake":
+        return FakeContainerBackend(runner_configuration.get("fake-backend"))
+    else:
+        return CliContainerBackend()
\ No newline at end of file
@@ -1,9 +1,11 @@
 
 from sylva_algorithm_runner import AlgorithmRunOrder, AlgorithmRunOrderStatus
 from bson import ObjectId
-from pymongo import MongoClient
+from pymongo import MongoClient, ASCENDING, DESCENDING, UpdateOne
+from pymongo.errors import DuplicateKeyError, OperationFailure
+import socket
 import typing
-import subprocess
+from datetime import datetime, timedelta, timezone
 
 class DatabaseRepository:
     """ Class to handle database operations. """
@@ -15,16 +17,84 @@ class DatabaseRepository:
         self.mongo_client = MongoClient(self.configuration["host"], port=self.configuration["port"], username=self.configuration["user"], password=self.configuration["password"], authSource="admin", tz_aware=True)
 
 
-    def add_if_missing(self, algorithm_run_order: AlgorithmRunOrder) -> bool:
-        """ Adds the given algorithm run order to the database if it is not already present (identified by sourceId). """
-        existing_order = self.__get_algorithm_run_order_collection().find_one({"sourceId": algorithm_run_order.sourceId})
-        added = False
+    def ensure_indexes(self):
+        """ Creates the indexes needed by the queries of this package. Safe to call on every startup as existing indexes are left untouched. """
+        self.__get_algorithm_run_order_collection().create_index([("status", ASCENDING), ("eligible", ASCENDING), ("_id", DESCENDING)], name="status_eligible_id")
 
-        if existing_order is None:
-            self.__get_algorithm_run_order_collection().insert_one(algorithm_run_order.to_dict())
-            added = True
+        try:
+            self.__get_algorithm_run_order_collection().create_index([("sourceId", ASCENDING)], name="sourceId", unique=True)
+        except OperationFailure as e:
+            print(f"Could not create unique index on sourceId, duplicate run orders need to be removed first: {e}")
 
-        return added
+        self.__get_algorithm_run_collection().create_index([("runOrder", ASCENDING), ("status", ASCENDING)], name="runOrder_status")
+        self.__get_algorithm_run_collection().create_index([("status", ASCENDING), ("dataCheck.nextCheck", ASCENDING)], name="status_dataCheck")
+
+        # keyset pagination and filters of API
+        self.__get_algorithm_run_order_collection().create_index([("algorithm", ASCENDING), ("_id", ASCENDING)], name="algorithm_id")
+        self.__get_algorithm_run_collection().create_index([("runOrder", ASCENDING), ("_id", ASCENDING)], name="runOrder_id")
+        self.__get_algorithm_run_collection().create_index([("runOrder", ASCENDING), ("status", ASCENDING), ("_id", ASCENDING)], name="runOrder_status_id")
+
+        # leases of run orders, slot numbers are unique so concurrency limits hold across hosts
+        self.__get_algorithm_run_order_collection().create_index([("lease.expires", ASCENDING)], name="lease_expires")
+        self.__get_algorithm_run_order_collection().create_index([("lease.globalSlot", ASCENDING)], name="lease_globalSlot", unique=True, partialFilterExpression={ "lease.globalSlot": { "$exists": True } })
+        self.__get_algorithm_run_order_collection().create_index([("lease.host", ASCENDING), ("lease.hostSlot", ASCENDING)], name="lease_host_hostSlot", unique=True, partialFilterExpression={ "lease.hostSlot": { "$exists": True } })
+
+        # children of matrix run orders
+        self.__get_algorithm_run_order_collection().create_index([("parent", ASCENDING), ("_id", ASCENDING)], name="parent_id", partialFilterExpression={ "parent": { "$type": "string" } })
+
+        # workspaces of datasets shared by runs
+        self.__get_data_workspace_collection().create_index([("workspace", ASCENDING)], name="workspace")
+        self.__get_algorithm_run_collection().create_index([("status", ASCENDING), ("workspace", ASCENDING)], name="status_workspace")
+
+        # log lines of runs, optionally expiring
+        self.__get_algorithm_run_log_collection().create_index([("run", ASCENDING), ("section", ASCENDING), ("seq", ASCENDING)], name="run_section_seq", unique=True)
+        if self.configuration.get("log-ttl-days") is not None:
+            try:
+                self.__get_algorithm_run_log_collection().create_index([("timestamp", ASCENDING)], name="timestamp_ttl", expireAfterSeconds=int(self.configuration["log-ttl-days"] * 86400))
+            except OperationFailure as e:
+                print(f"Could not create TTL index on log lines, an existing one with other expiry needs to be dropped first: {e}")
+
+
+    def backfill_run_order_state(self) -> int:
+        """ Sets latestRunStatus and eligible of all run orders from their algorithm runs. Needed once for data created before these fields existed. Returns the number of updated run orders. """
+        latest_runs = self.__get_algorithm_run_collection().aggregate([
+            { "$sort": { "start": -1 } },
+            { "$group": { "_id": "$runOrder", "status": { "$first": "$status" } } }
+        ])
+        latest_run_status = { latest_run["_id"]: latest_run["status"] for latest_run in latest_runs }
+
+        updates = []
+        for run_order in self.__get_algorithm_run_order_collection().find({}, projection={ "_id": 1, "matrix": 1 }):
+            status = latest_run_status.get(run_order["_id"])
+            # matrix run orders are run by their children only
+            updates.append(UpdateOne({ "_id": run_order["_id"] }, { "$set": { "latestRunStatus": status, "eligible": status is None and run_order.get("matrix") is None } }))
+
+        if len(updates) == 0:
+            return 0
+
+        return self.__get_algorithm_run_order_collection().bulk_write(updates, ordered=False).modified_count
+
+
+    def add_missing(self, algorithm_run_orders: typing.List[AlgorithmRunOrder]) -> dict:
+        """ Adds all given algorithm run orders which are not already present (identified by sourceId) with one query and one bulk write. Returns the number of created and unchanged run orders. """
+        run_orders_by_source_id = {algorithm_run_order.sourceId: algorithm_run_order for algorithm_run_order in algorithm_run_orders}
+        if len(run_orders_by_source_id) == 0:
+            return {"created": 0, "unchanged": 0}
+
+        existing = self.__get_algorithm_run_order_collection().find({"sourceId": {"$in": list(run_orders_by_source_id.keys())}}, projection={"sourceId": 1, "_id": 0})
+        existing_source_ids = {existing_order["sourceId"] for existing_order in existing}
+
+        # upserts keep it safe if an overlapping invocation inserted the same run order meanwhile
+        upserts = [
+            UpdateOne({"sourceId": source_id}, {"$setOnInsert": {**algorithm_run_order.to_dict(), "latestRunStatus": None, "eligible": not algorithm_run_order.is_matrix()}}, upsert=True)
+            for source_id, algorithm_run_order in run_orders_by_source_id.items() if source_id not in existing_source_ids
+        ]
+
+        created_count = 0
+        if len(upserts) > 0:
+            created_count = self.__get_algorithm_run_order_collection().bulk_write(upserts, ordered=False).upserted_count
+
+        return {"created": created_count, "unchanged": len(run_orders_by_source_id) - created_count}
 
     def get_algorithm_run_orders_raw(self, projection = None) -> list:
         """ Returns all algorithm run orders as noted in database. It's up to caller to do right projection. """
@@ -34,10 +104,135 @@ class DatabaseRepository:
         """ Returns all algorithm runs for the given algorithm run order as noted in database. It's up to caller to do right projection. """
         return list(self.__get_algorithm_run_collection().find({ "runOrder": ObjectId(run_order_id) }, projection=projection))
     
+    def find_algorithm_run_orders_raw(self, filter: dict = None, after: str = None, limit: int = 0, projection = None):
+        """ Returns a cursor over algorithm run orders matching the given filter, ordered by id and starting after the given id. Filter may contain status, algorithm, latestRunStatus, parent (sourceId of matrix run order) and from/to (creation time). It's up to caller to do right projection. """
+        query = self.__get_page_query(after)
+        filter = filter if filter is not None else {}
+
+        for name in ["status", "algorithm", "latestRunStatus", "parent"]:
+            if filter.get(name) is not None:
+                query[name] = filter[name]
+
+        # run orders have no timestamp of their own, creation time is part of their id
+        if filter.get("from") is not None:
+            query.setdefault("_id", {})["$gte"] = ObjectId.from_datetime(filter["from"])
+        if filter.get("to") is not None:
+            query.setdefault("_id", {})["$lt"] = ObjectId.from_datetime(filter["to"])
+
+        return self.__get_algorithm_run_order_collection().find(query, projection=projection).sort("_id", ASCENDING).limit(limit)
+
+    def find_algorithm_runs_raw(self, run_order_id: str, filter: dict = None, after: str = None, limit: int = 0, projection = None):
+        """ Returns a cursor over algorithm runs of the given algorithm run order matching the given filter, ordered by id and starting after the given id. Filter may contain status and from/to (start time). It's up to caller to do right projection. """
+        query = self.__get_page_query(after)
+        query["runOrder"] = ObjectId(run_order_id)
+        filter = filter if filter is not None else {}
+
+        if filter.get("status") is not None:
+            query["status"] = filter["status"]
+        if filter.get("from") is not None:
+            query.setdefault("start", {})["$gte"] = filter["from"]
+        if filter.get("to") is not None:
+            query.setdefault("start", {})["$lt"] = filter["to"]
+
+        return self.__get_algorithm_run_collection().find(query, projection=projection).sort("_id", ASCENDING).limit(limit)
+
+    def get_section_log_raw(self, run_order_id: str, run_id: str, section: str, offset: int = 0, since: datetime = None, limit: int = 1000) -> dict:
+        """ Returns start, end, status and count of the given section of an algorithm run together with its log lines starting at the given offset (number of lines appended before) or newer than the given timestamp. Offset of the result is the sequence number of its first line, which is larger than requested if lines expired meanwhile. """
+        run = self.__get_algorithm_run_collection().find_one(
+            { "_id": ObjectId(run_id), "runOrder": ObjectId(run_order_id) },
+            projection={ "status": 1, f"sections.{section}": 1 }
+        )
+        if run is None:
+            return None
+
+        run_section = run.get("sections", {}).get(section, {})
+        query = { "run": ObjectId(run_id), "section": section }
+        if since is not None:
+            query["timestamp"] = { "$gt": since }
+        else:
+            query["seq"] = { "$gte": offset }
+
+        log = list(self.__get_algorithm_run_log_collection().find(query, projection={ "_id": 0, "seq": 1, "timestamp": 1, "output": 1 }).sort("seq", ASCENDING).limit(limit))
+
+        return {
+            "runStatus": run.get("status"),
+            "start": run_section.get("start"),
+            "end": run_section.get("end"),
+            "status": run_section.get("status"),
+            "count": run_section.get("count", 0),
+            "lastTimestamp": run_section.get("lastTimestamp"),
+            "offset": log[0]["seq"] if len(log) > 0 else (run_section.get("count", 0) if since is not None else offset),
+            "log": log
+        }
+
+    def migrate_embedded_logs(self) -> int:
+        """ Moves log lines still kept inside algorithm run documents (sections.<SECTION>.log) to the log collection. Needed once for data created before the log collection existed. Returns the number of migrated runs. """
+        migrated_count = 0
+
+        for run in self.__get_algorithm_run_collection().find({ "sections": { "$exists": True } }, projection={ "sections": 1 }):
+            fields = {}
+            removed_fields = {}
+
+            for section, run_section in run["sections"].items():
+                log = run_section.get("log")
+                if log is None:
+                    continue
+
+                count = run_section.get("count", len(log))
+                first_seq = count - len(log)
+                if len(log) > 0:
+                    lines = [UpdateOne({ "run": run["_id"], "section": section, "seq": first_seq + index }, { "$setOnInsert": line }, upsert=True) for index, line in enumerate(log)]
+                    self.__get_algorithm_run_log_collection().bulk_write(lines, ordered=False)
+                    fields[f"sections.{section}.lastTimestamp"] = log[-1].get("timestamp")
+
+                fields[f"sections.{section}.count"] = count
+                removed_fields[f"sections.{section}.log"] = ""
+
+            if len(removed_fields) > 0:
+                self.__get_algorithm_run_collection().update_one({ "_id": run["_id"] }, { "$set": fields, "$unset": removed_fields })
+                migrated_count += 1
+
+        return migrated_count
+
+    def count_algorithm_runs_by_status(self) -> dict:
+        """ Returns the number of algorithm runs per status. """
+        return { group["_id"]: group["count"] for group in self.__get_algorithm_run_collection().aggregate([{ "$group": { "_id": "$status", "count": { "$sum": 1 } } }]) }
+
+    def count_eligible_run_orders(self) -> int:
+        """ Returns the number of run orders waiting for a slot to be run. """
+        return self.__get_algorithm_run_order_collection().count_documents({ "status": AlgorithmRunOrderStatus.CREATED.value, "eligible": True })
+
+    def get_section_duration_histograms(self, bounds: typing.List[float]) -> dict:
+        """ Returns count, sum and cumulative bucket counts (one per given upper bound) of the durations in seconds of all ended sections, per section. """
+        group = { "_id": "$section", "count": { "$sum": 1 }, "sum": { "$sum": "$duration" } }
+        for index, bound in enumerate(bounds):
+            group[f"bucket{index}"] = { "$sum": { "$cond": [{ "$lte": ["$duration", bound] }, 1, 0] } }
+
+        histograms = {}
+        for result in self.__get_algorithm_run_collection().aggregate([
+            { "$match": { "sections": { "$exists": True } } },
+            { "$project": { "section": { "$objectToArray": "$sections" } } },
+            { "$unwind": "$section" },
+            { "$match": { "section.v.start": { "$type": "date" }, "section.v.end": { "$type": "date" } } },
+            { "$project": { "section": "$section.k", "duration": { "$divide": [{ "$subtract": ["$section.v.end", "$section.v.start"] }, 1000] } } },
+            { "$group": group }
+        ]):
+            histograms[result["_id"]] = { "count": result["count"], "sum": result["sum"], "buckets": [result[f"bucket{index}"] for index in range(len(bounds))] }
+
+        return histograms
+
+    @staticmethod
+    def __get_page_query(after: str) -> dict:
+        return { "_id": { "$gt": ObjectId(after) } } if after is not None else {}
+
     def get_algorithm_run_raw(self, run_order_id: str, run_id: str, projection = None) -> list:
         """ Returns the requested algorithm run for the given algorithm run order as noted in database. It's up to caller to do right projection. """
         return self.__get_algorithm_run_collection().find_one({ "runOrder": ObjectId(run_order_id), "_id": ObjectId(run_id) }, projection=projection)
 
+    def get_algorithm_run_order_raw(self, run_order_id: str, projection = None) -> dict:
+        """ Returns the requested algorithm run order as noted in database. It's up to caller to do right projection. """
+        return self.__get_algorithm_run_order_collection().find_one({ "_id": ObjectId(run_order_id) }, projection=projection)
+
     def get_algorithm_run_order_in_status_created(self, id: str) -> AlgorithmRunOrder:
         """ Returns the algorithm run order with the given id if it is in status CREATED. """
         try: 
@@ -55,71 +250,83 @@ class DatabaseRepository:
         """ Checks if the given file is present in the database. """
         return self.__get_algorithm_run_collection().find_one({ "runOrder": ObjectId(run_order_id), "_id": ObjectId(run_id), "outputFiles": {"$elemMatch": {"filePath": file_path}} }) is not None
 
-    def find_next_to_run_id(self, count) -> typing.List[str]:
-        """ Returns the id of the next algorithm run order to run. This is either a run order with no algorithm runs or an algorithm run in status WAITING_FOR_DATA."""
-        
-        def count_local_sylva_algorithm_run_processes():
-            """Counts the number of local Unix processes running 'sylva-algorithm-run'."""
-            try:
-                output = subprocess.check_output(
-                    ["ps", "aux"], universal_newlines=True
-                )
-                lines = [line for line in output.splitlines() if "sylva-algorithm-run " in line]
-                for line in lines:
-                    print(line)
-                return len(lines)
-            except Exception:
-                return 0
-
-        currently_running_count = count_local_sylva_algorithm_run_processes() # currently running count is for local machine
+    def get_runs_waiting_for_data(self, due_before: datetime) -> list:
+        """ Returns all algorithm runs in status WAITING_FOR_DATA whose workspace is due to be checked. """
+        return list(self.__get_algorithm_run_collection().find(
+            { "status": "WAITING_FOR_DATA", "$or": [ { "dataCheck.nextCheck": { "$exists": False } }, { "dataCheck.nextCheck": { "$lte": due_before } } ] },
+            projection={ "_id": 1, "runOrder": 1, "workspace": 1, "dataCheck": 1 }
+        ))
+
+    def postpone_data_check(self, run_id: ObjectId, data_status: str, attempts: int, next_check: datetime):
+        """ Notes an unsuccessful check of the workspace of the given run and when to check next. """
+        self.__get_algorithm_run_collection().update_one(
+            { "_id": run_id },
+            { "$set": { "dataCheck": { "status": data_status, "attempts": attempts, "nextCheck": next_check } } }
+        )
+
+    def get_live_data_workspace(self, dataset: str) -> dict:
+        """ Returns the registered workspace of the given dataset if it is not expired, None otherwise. """
+        return self.__get_data_workspace_collection().find_one({ "_id": dataset, "status": { "$nin": ["expired", "ordering"] }, "expires": { "$gt": datetime.now(timezone.utc) } })
+
+    def claim_data_workspace_order(self, dataset: str, owner: str, claim_expires: datetime) -> bool:
+        """ Claims ordering a new workspace for the given dataset, so concurrent runs on the same dataset do not order it as well. Fails if the dataset has a live workspace or is being ordered by someone else whose claim did not expire. """
+        now = datetime.now(timezone.utc)
+        try:
+            self.__get_data_workspace_collection().update_one(
+                { "_id": dataset, "$or": [ { "status": "expired" }, { "expires": { "$lte": now } } ] },
+                { "$set": { "workspace": None, "status": "ordering", "owner": owner, "updated": now, "expires": claim_expires } },
+                upsert=True
+            )
+            return True
+        except DuplicateKeyError:
+            return False
+
+    def release_data_workspace_claim(self, dataset: str, owner: str):
+        """ Gives up a claim to order a workspace, e.g. as ordering failed. """
+        self.__get_data_workspace_collection().delete_one({ "_id": dataset, "status": "ordering", "owner": owner })
+
+    def register_data_workspace(self, dataset: str, workspace_id: str, expires: datetime):
+        """ Notes the given workspace as the one to use for the given dataset until it expires, replacing any workspace ordered before. """
+        now = datetime.now(timezone.utc)
+        self.__get_data_workspace_collection().replace_one(
+            { "_id": dataset },
+            { "workspace": workspace_id, "status": "ordered", "ordered": now, "updated": now, "expires": expires },
+            upsert=True
+        )
+
+    def get_data_workspace_status(self, workspace_id: str) -> str:
+        """ Returns the status of the given workspace as last seen at SYLVA Data Portal, None if it is not registered or expected to be expired. """
+        workspace = self.__get_data_workspace_collection().find_one({ "workspace": workspace_id, "expires": { "$gt": datetime.now(timezone.utc) } }, projection={ "status": 1 })
+        return workspace.get("status") if workspace is not None else None
+
+    def update_data_workspace_status(self, workspace_id: str, status: str):
+        self.__get_data_workspace_collection().update_many({ "workspace": workspace_id }, { "$set": { "status": status, "updated": datetime.now(timezone.utc) } })
+
+    def release_runs_waiting_for_workspace(self, workspace_id: str, data_status: str, next_check: datetime) -> int:
+        """ Makes the run orders of all runs waiting for the given workspace eligible to be run again as the workspace reached a final state. Returns the number of released run orders. """
+        runs = list(self.__get_algorithm_run_collection().find({ "status": "WAITING_FOR_DATA", "workspace": workspace_id }, projection={ "runOrder": 1 }))
+        if len(runs) == 0:
+            return 0
+
+        self.__get_algorithm_run_collection().update_many(
+            { "_id": { "$in": [run["_id"] for run in runs] } },
+            { "$set": { "dataCheck.status": data_status, "dataCheck.nextCheck": next_check } }
+        )
+        return self.__get_algorithm_run_order_collection().update_many(
+            { "_id": { "$in": [run["runOrder"] for run in runs] }, "latestRunStatus": "WAITING_FOR_DATA" },
+            { "$set": { "eligible": True } }
+        ).modified_count
+
+    def find_next_to_run_id(self, count, currently_running_count: int = None, excluded_ids: typing.List[str] = None) -> typing.List[str]:
+        """ Returns the id of the next algorithm run order to run. This is either a run order with no algorithm runs or an algorithm run in status WAITING_FOR_DATA. If currently_running_count is not given, it is taken from the active leases of local machine. """
+        if currently_running_count is None:
+            currently_running_count = len(self.get_active_lease_slots(socket.gethostname())[1])
         count_left = count - currently_running_count
 
-        print(f"Currently running processes on local machine: {currently_running_count}, new possible processes: {count_left}.")
+        print(f"Currently running runs on local machine: {currently_running_count}, new possible runs: {count_left}.")
 
         if count_left > 0:
-            results = self.__get_algorithm_run_order_collection().aggregate([
-                {
-                    "$lookup": {
-                    "from": "algorithmRuns",
-                    "localField": "_id",
-                    "foreignField": "runOrder",
-                    "as": "algorithmRuns"
-                    }
-                },
-                {
-                    "$sort": { 'algorithmRuns.status' : -1 }
-                },
-                {
-                    "$sort": { "_id": -1 }
-                },
-                {
-                    "$match": {
-                        "$and": [
-                            { "status": "CREATED" },
-                            { "$or": [
-                                {
-                                    'algorithmRuns.status': 'WAITING_FOR_DATA'
-                                },
-                                {
-                                    "algorithmRuns": {
-                                        "$size": 0
-                                    }
-                                }
-                                ]}
-                        ]
-                    }
-                },
-                {
-                    "$project": {
-                    "_id": 1
-                    }
-                },
-                {
-                    "$limit": count_left
-                }
-            ])
-
-            found = [str(result['_id']) for result in results]
+            found = [str(result['_id']) for result in self.find_eligible_run_orders_raw(count_left, excluded_ids, { "_id": 1 })]
             
             print(f"Found {len(found)} algorithm run orders to start.")
 
@@ -127,8 +334,140 @@ class DatabaseRepository:
         else:
             return []
 
+    def find_eligible_run_orders_raw(self, limit: int, excluded_ids: typing.List[str] = None, projection = None, host: str = None) -> list:
+        """ Returns up to limit run orders which may be run next on the given host (local machine by default), newest first. It's up to caller to do right projection. """
+        now = datetime.now(timezone.utc)
+        # eligible is maintained by LogRepository and DataAvailabilityPoller: run orders without runs or with latest run WAITING_FOR_DATA whose data became available
+        return list(self.__get_algorithm_run_order_collection().find(
+            {
+                "status": AlgorithmRunOrderStatus.CREATED.value,
+                "eligible": True,
+                "_id": { "$nin": [ObjectId(id) for id in (excluded_ids or [])] },
+                "$and": [
+                    { "$or": [ { "lease": { "$exists": False } }, { "lease.expires": { "$lte": now } } ] },
+                    self.__get_resume_host_query(host if host is not None else socket.gethostname(), now)
+                ]
+            },
+            projection=projection
+        ).sort("_id", DESCENDING).limit(limit))
+
+    @staticmethod
+    def __get_resume_host_query(host: str, now: datetime) -> dict:
+        """ Interrupted runs are resumed on the host they were interrupted on, as their container may still run there. Other hosts may take them once resumeHostUntil passed, e.g. as the host is gone. """
+        return { "$or": [ { "resumeHost": { "$exists": False } }, { "resumeHost": host }, { "resumeHostUntil": { "$lte": now } } ] }
+
+    def get_active_lease_slots(self, host: str) -> tuple:
+        """ Returns the global slots and the slots of the given host taken by unexpired leases. """
+        global_slots = set()
+        host_slots = set()
+
+        for run_order in self.__get_algorithm_run_order_collection().find({ "lease.expires": { "$gt": datetime.now(timezone.utc) } }, projection={ "lease": 1 }):
+            lease = run_order["lease"]
+            if lease.get("globalSlot") is not None:
+                global_slots.add(lease["globalSlot"])
+            if lease.get("host") == host:
+                host_slots.add(lease["hostSlot"])
+
+        return global_slots, host_slots
+
+    def count_active_leases_by_host(self) -> dict:
+        """ Returns the number of unexpired leases, i.e. slots taken, per host. """
+        counts = self.__get_algorithm_run_order_collection().aggregate([
+            { "$match": { "lease.expires": { "$gt": datetime.now(timezone.utc) } } },
+            { "$group": { "_id": "$lease.host", "count": { "$sum": 1 } } }
+        ])
+        return { count["_id"]: count["count"] for count in counts }
+
+    def claim_run_order(self, run_order_id: str, lease: dict, require_eligible: bool = True) -> bool:
+        """ Sets the given lease on the run order if it is in status CREATED, eligible (unless not required, e.g. for runs started by hand) and not leased by anyone else. Returns False if the run order is leased already, was run meanwhile or one of the slots of the lease was taken meanwhile. """
+        if not ObjectId.is_valid(run_order_id):
+            return False
+
+        query = { "_id": ObjectId(run_order_id), "status": AlgorithmRunOrderStatus.CREATED.value, "lease": { "$exists": False }, **self.__get_resume_host_query(lease["host"], datetime.now(timezone.utc)) }
+        if require_eligible:
+            query["eligible"] = True
+
+        try:
+            run_order = self.__get_algorithm_run_order_collection().find_one_and_update(
+                query,
+                { "$set": { "lease": lease }, "$unset": { "resumeHost": "", "resumeHostUntil": "" } },
+                projection={ "_id": 1 }
+            )
+        except DuplicateKeyError:
+            return False
+
+        return run_order is not None
+
+    def renew_run_order_lease(self, run_order_id: str, owner: str, expires: datetime) -> bool:
+        """ Extends the lease of the given owner. Returns False if the lease was lost, e.g. reclaimed after it expired. """
+        return self.__get_algorithm_run_order_collection().update_one(
+            { "_id": ObjectId(run_order_id), "lease.owner": owner },
+            { "$set": { "lease.expires": expires, "lease.renewed": datetime.now(timezone.utc) } }
+        ).modified_count == 1
+
+    def release_run_order_lease(self, run_order_id: str, owner: str):
+        self.__get_algorithm_run_order_collection().update_one({ "_id": ObjectId(run_order_id), "lease.owner": owner }, { "$unset": { "lease": "" } })
+
+    def reclaim_expired_run_order_leases(self, max_resumes: int = 3, resume_host_timeout: int = 3600) -> list:
+        """ Removes leases not renewed in time, e.g. as the host holding them crashed, so their slots can be taken again. Runs of these run orders still noted as RUNNING are marked INTERRUPTED and their run orders made eligible, so they are resumed; on the host of the lease only for resume_host_timeout seconds. Runs interrupted max_resumes times already are failed. Returns the ids of the reclaimed run orders. """
+        now = datetime.now(timezone.utc)
+        reclaimed = []
+
+        for run_order in self.__get_algorithm_run_order_collection().find({ "lease.expires": { "$lte": now } }, projection={ "lease": 1 }):
+            # lease might have been renewed meanwhile
+            result = self.__get_algorithm_run_order_collection().update_one(
+                { "_id": run_order["_id"], "lease.owner": run_order["lease"]["owner"], "lease.expires": { "$lte": now } },
+                { "$unset": { "lease": "" } }
+            )
+            if result.modified_count == 0:
+                continue
+
+            failed = self.__get_algorithm_run_collection().update_many(
+                { "runOrder": run_order["_id"], "status": "RUNNING", "resumeCount": { "$gte": max_resumes } },
+                { "$set": { "status": "FAILURE", "end": now, "failure": f"Lease of {run_order['lease']['owner']} expired, run was resumed {max_resumes} times already." } }
+            )
+            interrupted = self.__get_algorithm_run_collection().update_many(
+                { "runOrder": run_order["_id"], "status": "RUNNING" },
+                { "$set": { "status": "INTERRUPTED", "interrupted": now, "interruptedHost": run_order["lease"]["host"] }, "$inc": { "resumeCount": 1 } }
+            )
+
+            if interrupted.modified_count > 0:
+                self.__get_algorithm_run_order_collection().update_one(
+                    { "_id": run_order["_id"] },
+                    { "$set": { "latestRunStatus": "INTERRUPTED", "eligible": True, "resumeHost": run_order["lease"]["host"], "resumeHostUntil": now + timedelta(seconds=resume_host_timeout) } }
+                )
+            elif failed.modified_count > 0:
+                self.__get_algorithm_run_order_collection().update_one({ "_id": run_order["_id"] }, { "$set": { "latestRunStatus": "FAILURE" } })
+
+            reclaimed.append(str(run_order["_id"]))
+
+        return reclaimed
+
+    def get_algorithm_run_statuses(self, run_ids: typing.List[str]) -> dict:
+        """ Returns the status of each of the given algorithm runs which exists. """
+        runs = self.__get_algorithm_run_collection().find({ "_id": { "$in": [ObjectId(id) for id in run_ids if ObjectId.is_valid(id)] } }, projection={ "status": 1 })
+        return { str(run["_id"]): run.get("status") for run in runs }
+
+    def count_matrix_children_by_status(self, parent_source_id: str) -> dict:
+        """ Returns the number of child run orders of the given matrix run order per status of their latest run, "PENDING" for those not run yet. """
+        counts = self.__get_algorithm_run_order_collection().aggregate([
+            { "$match": { "parent": parent_source_id } },
+            { "$group": { "_id": { "$ifNull": ["$latestRunStatus", "PENDING"] }, "count": { "$sum": 1 } } }
+        ])
+        return { count["_id"]: count["count"] for count in counts }
+
+    def get_algorithm_run_orders_by_id_raw(self, ids: typing.List[str], projection = None) -> list:
+        """ Returns the algorithm run orders with the given ids. It's up to caller to do right projection. """
+        return list(self.__get_algorithm_run_order_collection().find({ "_id": { "$in": [ObjectId(id) for id in ids if ObjectId.is_valid(id)] } }, projection=projection))
+
     def __get_algorithm_run_order_collection(self):
         return self.mongo_client[self.configuration["database"]].algorithmRunOrders
     
     def __get_algorithm_run_collection(self):
         return self.mongo_client[self.configuration["database"]].algorithmRuns
+
+    def __get_data_workspace_collection(self):
+        return self.mongo_client[self.configuration["database"]].dataWorkspaces
+
+    def __get_algorithm_run_log_collection(self):
+        return self.mongo_client[self.configuration["database"]].algorithmRunLogs
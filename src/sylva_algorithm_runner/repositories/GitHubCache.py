@@ -0,0 +1,53 @@
+import fcntl
+import json
+import os
+import tempfile
+
+
+class GitHubCache:
+    """ Persistent cache of GitHubRepository to skip unchanged data on next read: last seen commit, ETags of API responses and SHAs of blobs already turned into run orders. Use as context manager, which holds an exclusive lock so concurrent invocations do not interfere. A corrupt cache file is ignored and replaced. """
+    cache_file = None
+
+    commit = None
+    etags = {}
+    blob_shas = set()
+
+    def __init__(self, cache_file: str) -> None:
+        self.cache_file = cache_file
+        self.etags = {}
+        self.blob_shas = set()
+        self.__lock_file = None
+
+    def __enter__(self) -> 'GitHubCache':
+        self.__lock_file = open(f"{self.cache_file}.lock", "a")
+        fcntl.flock(self.__lock_file, fcntl.LOCK_EX)
+
+        try:
+            with open(self.cache_file, "r") as file:
+                content = json.load(file)
+
+            self.commit = content.get("commit")
+            self.etags = dict(content.get("etags", {}))
+            self.blob_shas = set(content.get("blobShas", []))
+        except (OSError, ValueError, AttributeError, TypeError) as e:
+            if not isinstance(e, FileNotFoundError):
+                print(f"Ignoring unreadable GitHub cache {self.cache_file}: {e}")
+            self.commit = None
+            self.etags = {}
+            self.blob_shas = set()
+
+        return self
+
+    def __exit__(self, *args):
+        fcntl.flock(self.__lock_file, fcntl.LOCK_UN)
+        self.__lock_file.close()
+        self.__lock_file = None
+
+    def save(self):
+        """ Writes the cache atomically, so an interrupted write never leaves a partial file. """
+        directory = os.path.dirname(os.path.abspath(self.cache_file))
+        with tempfile.NamedTemporaryFile("w", dir=directory, delete=False) as file:
+            json.dump({"commit": self.commit, "etags": self.etags, "blobShas": sorted(self.blob_shas)}, file)
+            temporary_file = file.name
+
+        os.replace(temporary_file, self.cache_file)
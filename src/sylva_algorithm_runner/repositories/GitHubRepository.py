@@ -1,26 +1,76 @@
 import requests
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 
 from sylva_algorithm_runner import AlgorithmRunOrder
+from .GitHubCache import GitHubCache
+
+
+class GitHubRateLimitError(Exception):
+    """ Raised if GitHub API refuses a request as rate limit is exceeded. """
+    reset = None
+
+    def __init__(self, reset: float = None) -> None:
+        self.reset = reset
+        super().__init__("GitHub API rate limit exceeded" + (f", resets at {time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(reset))}." if reset is not None else "."))
+
 
 class GitHubRepository:
     """ This class is responsible for reading the configuration and the algorithm run orders from the GitHub repository. It also provides a method to get the tag for a public release. """
     configuration = None
+    workers = 8
 
     def __init__(self, github_configuration: dict = None) -> None:        
         self.configuration = github_configuration
-
-    def get_current_run_orders(self):
-        """ Reads the algorithm run orders from the GitHub repository and returns them as a list. """
-        response = self.__read_api(f"https://api.github.com/repos/{self.configuration['repository']}/branches/main")
+        if self.configuration is not None:
+            self.workers = self.configuration.get("workers", self.workers)
+
+        # one keep-alive session shared by all (concurrent) requests
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=self.workers))
+
+    def get_current_run_orders(self, cache: GitHubCache = None):
+        """ Reads the algorithm run orders from the GitHub repository and returns them as a list. If a cache is given, only run orders of blobs not seen before are returned and nothing is read beyond the branch if its head did not move. Caller needs to save the cache after processing the run orders. """
+        branch_url = f"https://api.github.com/repos/{self.configuration['repository']}/branches/main"
+        response = self.__read_api(branch_url, cache)
+        if response is None or (cache is not None and response["commit"]["sha"] == cache.commit):
+            # branch head did not move
+            return []
+
+        commit = response["commit"]["sha"]
         tree_url = response["commit"]["commit"]["tree"]["url"]
 
-        response = self.__read_api(tree_url)
-        blobs = self.__get_yamls(response["tree"])
+        response = self.__read_api(f"{tree_url}?recursive=1")
+        if response.get("truncated", False):
+            # tree too large to be returned at once, walk it level by level
+            response = self.__read_api(tree_url)
+            items = self.__get_yaml_items(response["tree"])
+        else:
+            items = [item for item in response["tree"] if self.__is_yaml(item)]
+
+        if cache is not None:
+            # blob URL (and therefore sourceId) is derived from its SHA, so known blobs are in database already
+            known_shas = cache.blob_shas & {item["sha"] for item in items}
+            items = [item for item in items if item["sha"] not in known_shas]
+
+        blobs = self.__read_blobs(items)
+
+        if cache is not None:
+            read_shas = {item["sha"] for item in items if item["url"] in blobs}
+            cache.blob_shas = known_shas | read_shas
+            # keep old commit if some blobs could not be read, so next invocation retries; branch must not answer 304 then
+            if len(read_shas) == len(items):
+                cache.commit = commit
+            else:
+                cache.etags.pop(branch_url, None)
         
         algorithmRunOrders = []
         for id, blob in blobs.items():
             algorithmOrder = AlgorithmRunOrder.from_source(id, blob)
             algorithmRunOrders.append(algorithmOrder)
+            algorithmRunOrders += algorithmOrder.expand()
 
         return algorithmRunOrders
     
@@ -45,39 +95,77 @@ class GitHubRepository:
             'X-GitHub-Api-Version': '2022-11-28',
             'Accept': 'application/vnd.github+json'
         }
-        return requests.get(f'{path}', headers=headers).json()
+        return self.session.get(f'{path}', headers=headers).json()
 
 
-    def __read_api(self, path):
-        """ Reads the GitHub API with the given path and returns the JSON response. """
+    def __read_api(self, path, cache: GitHubCache = None):
+        """ Reads the GitHub API with the given path and returns the JSON response. If a cache is given, the request is conditional and None is returned if the response did not change. """
         headers = {
             'Authorization': f'token {self.configuration["token"]}',
             'X-GitHub-Api-Version': '2022-11-28',
             'Accept': 'application/vnd.github+json'
         }
-        return requests.get(f'{path}', headers=headers).json()
+        if cache is not None and path in cache.etags:
+            headers['If-None-Match'] = cache.etags[path]
+
+        response = self.session.get(f'{path}', headers=headers)
+        if response.status_code == 304:
+            return None
+
+        self.__check_rate_limit(response)
+        response.raise_for_status()
+
+        if cache is not None and "ETag" in response.headers:
+            cache.etags[path] = response.headers["ETag"]
+
+        return response.json()
 
 
     def __read_blob(self, path):
+        headers = {
+            'Authorization': f'token {self.configuration["token"]}',
+            'X-GitHub-Api-Version': '2022-11-28',
+            'Accept': 'application/vnd.github.raw+json'
+        }
+
         try:
-            headers = {
-                'Authorization': f'token {self.configuration["token"]}',
-                'X-GitHub-Api-Version': '2022-11-28',
-                'Accept': 'application/vnd.github.raw+json'
-            }
-            return requests.get(f'{path}', headers=headers).text
-        except Exception as e:
+            response = self.session.get(f'{path}', headers=headers)
+        except requests.RequestException as e:
             return None
 
+        self.__check_rate_limit(response)
+        return response.text if response.status_code == 200 else None
+
+
+    def __read_blobs(self, items):
+        """ Downloads the given blobs concurrently and returns their content by URL. Blobs which could not be read are left out. """
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            contents = executor.map(lambda item: self.__read_blob(item["url"]), items)
+            return {item["url"]: content for item, content in zip(items, contents) if content is not None}
+
+
+    @staticmethod
+    def __check_rate_limit(response):
+        """ Raises GitHubRateLimitError if the request was refused due to rate limit, so it is never taken as (empty) content. """
+        if response.status_code in [403, 429] and (response.headers.get("X-RateLimit-Remaining") == "0" or "Retry-After" in response.headers):
+            if "Retry-After" in response.headers:
+                raise GitHubRateLimitError(time.time() + float(response.headers["Retry-After"]))
+
+            reset = response.headers.get("X-RateLimit-Reset")
+            raise GitHubRateLimitError(float(reset) if reset is not None else None)
+
+
+    @staticmethod
+    def __is_yaml(item):
+        return item["type"] == "blob" and item["path"].endswith(".yaml")
+
 
-    def __get_yamls(self, tree):
-        blobs = {}
+    def __get_yaml_items(self, tree):
+        items = []
         for item in tree:
-            if item["type"] == "blob" and item["path"].endswith(".yaml"):
-                blob = self.__read_blob(item["url"])
-                if blob is not None:
-                    blobs[item["url"]] = blob
+            if self.__is_yaml(item):
+                items.append(item)
 
             elif item["type"] == "tree":
-                blobs = {**blobs, **self.__get_yamls(self.__read_api(item["url"])["tree"])}
-        return blobs
+                items += self.__get_yaml_items(self.__read_api(item["url"])["tree"])
+        return items
\ No newline at end of file
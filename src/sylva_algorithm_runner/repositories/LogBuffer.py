@@ -0,0 +1,91 @@
+import queue
+import threading
+import time
+import typing
+
+
+class LogBuffer:
+    """ Class to write log lines of algorithm runs in batches. Lines are queued by the caller and written by a background thread which groups them per run and section and hands them to the write function at once when batch size or flush interval is reached. """
+    batch_size = 100
+    flush_interval = 1.0
+    put_timeout = 5.0
+
+    def __init__(self, write: typing.Callable[[str, str, list], None], buffer_configuration: dict = None) -> None:
+        buffer_configuration = buffer_configuration if buffer_configuration is not None else {}
+
+        self.write = write
+        self.batch_size = buffer_configuration.get("batch-size", self.batch_size)
+        self.flush_interval = buffer_configuration.get("flush-interval", self.flush_interval)
+        self.put_timeout = buffer_configuration.get("put-timeout", self.put_timeout)
+
+        self.__queue = queue.Queue(maxsize=buffer_configuration.get("queue-size", 10000))
+        self.__pending = {}
+        self.__pending_count = 0
+        self.__statistics = {}
+        self.__counter_lock = threading.Lock()
+
+        self.__thread = threading.Thread(target=self.__write_loop, name="log-buffer", daemon=True)
+        self.__thread.start()
+
+    def append(self, pid: str, section: str, entry: dict) -> bool:
+        """ Queues the given log entry. Blocks up to put_timeout seconds if the queue is full and drops the entry afterwards. Returns True if the entry was queued. """
+        try:
+            self.__queue.put((pid, section, entry), timeout=self.put_timeout)
+            return True
+        except queue.Full:
+            self.__count(pid, dropped=1)
+            return False
+
+    def flush(self):
+        """ Blocks until all entries queued so far are written to database. """
+        flushed = threading.Event()
+        self.__queue.put(flushed)
+        flushed.wait()
+
+    def get_statistics(self, pid: str) -> dict:
+        """ Returns the number of lines of the given run written and dropped so far. """
+        with self.__counter_lock:
+            return dict(self.__statistics.get(pid, {"written": 0, "dropped": 0}))
+
+    def __count(self, pid: str, written: int = 0, dropped: int = 0):
+        with self.__counter_lock:
+            statistics = self.__statistics.setdefault(pid, {"written": 0, "dropped": 0})
+            statistics["written"] += written
+            statistics["dropped"] += dropped
+
+    def __write_loop(self):
+        last_flush = time.monotonic()
+
+        while True:
+            timeout = max(0, self.flush_interval - (time.monotonic() - last_flush))
+            try:
+                item = self.__queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if isinstance(item, threading.Event):
+                self.__write_pending()
+                last_flush = time.monotonic()
+                item.set()
+                continue
+
+            if item is not None:
+                pid, section, entry = item
+                self.__pending.setdefault((pid, section), []).append(entry)
+                self.__pending_count += 1
+
+            if self.__pending_count >= self.batch_size or time.monotonic() - last_flush >= self.flush_interval:
+                self.__write_pending()
+                last_flush = time.monotonic()
+
+    def __write_pending(self):
+        for (pid, section), entries in self.__pending.items():
+            try:
+                self.write(pid, section, entries)
+                self.__count(pid, written=len(entries))
+            except Exception as e:
+                print(f"Could not write {len(entries)} log lines of section {section}: {e}")
+                self.__count(pid, dropped=len(entries))
+
+        self.__pending = {}
+        self.__pending_count = 0
@@ -1,89 +1,152 @@
-from pymongo import MongoClient
+from pymongo import MongoClient, ReturnDocument
 from datetime import datetime, timezone
 from .. import AlgorithmRunOrder
 from bson import ObjectId
+from .LogBuffer import LogBuffer
 
 class LogRepository:
     """ Class to handle logging of algorithm runs. """
     configuration = None
     mongo_client = None
     log_to_stdout = False
+    log_buffer = None
+    stopped = False
 
 
-    def __init__(self, database_configuration: dict, log_to_stdout: bool = False) -> None:
+    def __init__(self, database_configuration: dict, log_to_stdout: bool = False, buffer_configuration: dict = None) -> None:
         self.configuration = database_configuration
         self.mongo_client = MongoClient(self.configuration["host"], port=self.configuration["port"], username=self.configuration["user"], password=self.configuration["password"], authSource="admin", tz_aware=True)
         self.log_to_stdout = log_to_stdout
 
+        if buffer_configuration is not None:
+            self.log_buffer = LogBuffer(self.__write_log_lines, buffer_configuration)
+
 
     def __get_algorithm_runs_collection(self):
         return self.mongo_client[self.configuration["database"]].algorithmRuns
 
-    def get_waiting_for_data(self, algorithm_run_order: AlgorithmRunOrder):
-        return self.__get_algorithm_runs_collection().find_one({"status": "WAITING_FOR_DATA", "runOrder": algorithm_run_order._id})
+    def __get_algorithm_run_orders_collection(self):
+        return self.mongo_client[self.configuration["database"]].algorithmRunOrders
+
+    def __get_algorithm_run_logs_collection(self):
+        return self.mongo_client[self.configuration["database"]].algorithmRunLogs
+
+    def stop(self):
+        """ Stops writing anything about runs, e.g. as the run was taken over by another runner. Log lines queued before are written still. """
+        self.close()
+        self.stopped = True
+
+    def close(self):
+        """ Writes all queued log lines, to be called before the process exits as the writer of the log buffer does not keep it alive. """
+        if self.log_buffer is not None:
+            self.log_buffer.flush()
+
+    def __write_log_lines(self, pid: str, section: str, entries: list):
+        """ Appends the given log lines to the log collection. Sequence numbers are reserved by incrementing the line count of the section in the run document. """
+        if self.stopped:
+            return
+
+        run = self.__get_algorithm_runs_collection().find_one_and_update(
+            {"_id": ObjectId(pid)},
+            {
+                "$inc": {f"sections.{section}.count": len(entries)},
+                "$set": {f"sections.{section}.lastTimestamp": entries[-1]["timestamp"]}
+            },
+            projection={f"sections.{section}.count": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if run is None:
+            raise ValueError(f"Run {pid} does not exist.")
+
+        first_seq = run["sections"][section]["count"] - len(entries)
+        self.__get_algorithm_run_logs_collection().insert_many(
+            [{"run": ObjectId(pid), "section": section, "seq": first_seq + index, **entry} for index, entry in enumerate(entries)],
+            ordered=False
+        )
+
+    def __update_run_order_state(self, run_order_id: ObjectId, run_status: str):
+        """ Keeps the denormalized status of the latest run in the run order document, used to find next run orders to run. Run orders waiting for data are made eligible again by DataAvailabilityPoller. """
+        self.__get_algorithm_run_orders_collection().update_one(
+            {"_id": run_order_id},
+            {"$set": {"latestRunStatus": run_status, "eligible": False}}
+        )
+
+    def __update_run_document(self, pid: str, update: dict, upsert: bool = False):
+        if self.stopped:
+            return
+
+        self.__get_algorithm_runs_collection().update_one({"_id": ObjectId(pid)}, update, upsert=upsert)
+
+    def __update_run(self, pid: str, fields: dict):
+        """ Sets the given fields of the run and propagates its status to the run order. """
+        if self.stopped:
+            return
+
+        run = self.__get_algorithm_runs_collection().find_one_and_update(
+            {"_id": ObjectId(pid)},
+            {"$set": fields},
+            projection={"runOrder": 1}
+        )
+
+        if run is not None and "runOrder" in run:
+            self.__update_run_order_state(run["runOrder"], fields["status"])
+
+    def get_resumable_run(self, algorithm_run_order: AlgorithmRunOrder):
+        """ Returns the run of the given run order which waits for data or was interrupted, None if there is none. """
+        return self.__get_algorithm_runs_collection().find_one({"status": {"$in": ["WAITING_FOR_DATA", "INTERRUPTED"]}, "runOrder": algorithm_run_order._id})
 
     def start_run(self, algorithm_run_order: AlgorithmRunOrder) -> str:
         """ Initializes a new run and returns the id of the run object."""
         algorithm_runs_collection = self.__get_algorithm_runs_collection()
         insert_result = algorithm_runs_collection.insert_one({"start": datetime.now(timezone.utc), "status": "RUNNING", "runOrder": algorithm_run_order._id})
+        self.__update_run_order_state(algorithm_run_order._id, "RUNNING")
         return str(insert_result.inserted_id)
 
     def end_run(self, pid: str, status: object):
-        algorithm_runs_collection = self.__get_algorithm_runs_collection()
-        algorithm_runs_collection.update_one(
-            {"_id": ObjectId(pid)},
-            {"$set": {"end": datetime.now(timezone.utc), "status": status.value}}
-        )
+        fields = {"end": datetime.now(timezone.utc), "status": status.value}
+
+        if self.log_buffer is not None:
+            self.log_buffer.flush()
+            fields["logStatistics"] = self.log_buffer.get_statistics(pid)
+
+        self.__update_run(pid, fields)
 
     def set_status(self, pid: str, status: object):
-        algorithm_runs_collection = self.__get_algorithm_runs_collection()
-        algorithm_runs_collection.update_one(
-            {"_id": ObjectId(pid)},
-            {"$set": {"status": status.value}}
-        )
+        # process may exit right after, e.g. when waiting for data
+        self.close()
+        self.__update_run(pid, {"status": status.value})
 
     def log_output_files(self, pid: str, output_files: list):
-        algorithm_runs_collection = self.__get_algorithm_runs_collection()
-        algorithm_runs_collection.update_one(
-            {"_id": ObjectId(pid)},
-            {"$set": {"outputFiles": output_files}}
-        )
+        self.__update_run_document(pid, {"$set": {"outputFiles": output_files}})
 
     def append_log(self, pid: str, run_section: object, log_line: str):
         if (self.log_to_stdout):
             print(log_line)
-        
-        algorithm_runs_collection = self.__get_algorithm_runs_collection()
-        algorithm_runs_collection.update_one(
-            {"_id": ObjectId(pid)},
-            {
-                "$push": {
-                    f"sections.{run_section.value}.log": {
-                        "$each": [{"timestamp": datetime.now(timezone.utc), "output": log_line}],
-                        "$slice": -1000
-                    }
-                }
-            }
-        )
+
+        entry = {"timestamp": datetime.now(timezone.utc), "output": log_line}
+
+        if self.log_buffer is not None:
+            self.log_buffer.append(pid, run_section.value, entry)
+        else:
+            self.__write_log_lines(pid, run_section.value, [entry])
+
+    def log_images(self, pid: str, images: dict):
+        self.__update_run_document(pid, {"$set": {"images": images}})
+
+    def log_preparation(self, pid: str, preparation: dict):
+        self.__update_run_document(pid, {"$set": {"preparation": preparation}})
+
+    def log_resource_usage(self, pid: str, resource_usage: dict):
+        self.__update_run_document(pid, {"$set": {"resourceUsage": resource_usage}})
 
     def log_workspace_id(self, pid: str, workspace_id: str):
-        algorithm_runs_collection = self.__get_algorithm_runs_collection()
-        algorithm_runs_collection.update_one(
-            {"_id": ObjectId(pid)},
-            {"$set": {"workspace": workspace_id}}
-        )
+        self.__update_run_document(pid, {"$set": {"workspace": workspace_id}})
 
     def start_section(self, pid: str, run_section: object):
-        algorithm_runs_collection = self.__get_algorithm_runs_collection()
-        algorithm_runs_collection.update_one(
-            {"_id": ObjectId(pid)},
-            {"$set": {f"sections.{run_section.value}.start": datetime.now(timezone.utc)}},
-            upsert=True
-        )
+        self.__update_run_document(pid, {"$set": {f"sections.{run_section.value}.start": datetime.now(timezone.utc)}}, upsert=True)
     
     def end_section(self, pid: str, run_section: object, status: object):
-        algorithm_runs_collection = self.__get_algorithm_runs_collection()
-        algorithm_runs_collection.update_one(
-            {"_id": ObjectId(pid)},
-            {"$set": { f"sections.{run_section.value}.end": datetime.now(timezone.utc), f"sections.{run_section.value}.status": status.value }}
-        )
\ No newline at end of file
+        if self.log_buffer is not None:
+            self.log_buffer.flush()
+
+        self.__update_run_document(pid, {"$set": { f"sections.{run_section.value}.end": datetime.now(timezone.utc), f"sections.{run_section.value}.status": status.value }})
\ No newline at end of file
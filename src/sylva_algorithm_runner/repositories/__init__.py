@@ -1,3 +1,4 @@
-from .GitHubRepository import GitHubRepository
+from .GitHubCache import GitHubCache
+from .GitHubRepository import GitHubRepository, GitHubRateLimitError
 from .DatabaseRepository import DatabaseRepository
 from .LogRepository import LogRepository
\ No newline at end of file
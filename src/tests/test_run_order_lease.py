@@ -0,0 +1,80 @@
+""" Tests claiming run orders against a MongoDB given by SYLVA_TEST_MONGO_HOST and SYLVA_TEST_MONGO_PORT (localhost:27017 by default). Skipped if it is not reachable. """
+
+import os
+import sys
+
+import pytest
+
+pymongo = pytest.importorskip("pymongo")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sylva_algorithm_runner import RunOrderLease
+from sylva_algorithm_runner.repositories import DatabaseRepository
+
+
+@pytest.fixture
+def database_configuration():
+    configuration = {
+        "host": os.environ.get("SYLVA_TEST_MONGO_HOST", "localhost"),
+        "port": int(os.environ.get("SYLVA_TEST_MONGO_PORT", "27017")),
+        "user": os.environ.get("SYLVA_TEST_MONGO_USER"),
+        "password": os.environ.get("SYLVA_TEST_MONGO_PASSWORD"),
+        "database": "algorithm-runner-test"
+    }
+
+    client = pymongo.MongoClient(configuration["host"], port=configuration["port"], username=configuration["user"], password=configuration["password"], authSource="admin", serverSelectionTimeoutMS=1000)
+    try:
+        client.admin.command("ping")
+    except pymongo.errors.PyMongoError:
+        pytest.skip("MongoDB is not reachable")
+
+    client.drop_database(configuration["database"])
+    yield configuration
+    client.drop_database(configuration["database"])
+
+
+@pytest.fixture
+def database_repository(database_configuration):
+    database_repository = DatabaseRepository(database_configuration)
+    database_repository.ensure_indexes()
+    return database_repository
+
+
+def add_run_order(database_repository, source_id: str, **fields) -> str:
+    collection = database_repository.mongo_client[database_repository.configuration["database"]].algorithmRunOrders
+    return str(collection.insert_one({"status": "CREATED", "sourceId": source_id, "latestRunStatus": None, "eligible": True, **fields}).inserted_id)
+
+
+def test_claim_of_eligible_run_order_succeeds_once(database_repository):
+    run_order_id = add_run_order(database_repository, "eligible")
+
+    first_lease = RunOrderLease({"parallel": 2}, database_repository)
+    second_lease = RunOrderLease({"parallel": 2}, database_repository)
+    try:
+        assert first_lease.claim(run_order_id)
+        assert not second_lease.claim(run_order_id)
+    finally:
+        first_lease.release()
+        second_lease.release()
+
+
+def test_claim_of_finished_run_order_fails(database_repository):
+    # run by another host between finding it eligible and claiming it
+    run_order_id = add_run_order(database_repository, "finished", latestRunStatus="SUCCESS", eligible=False)
+
+    run_order_lease = RunOrderLease({"parallel": 2}, database_repository)
+    try:
+        assert not run_order_lease.claim(run_order_id)
+    finally:
+        run_order_lease.release()
+
+
+def test_claim_of_finished_run_order_by_hand_succeeds(database_repository):
+    run_order_id = add_run_order(database_repository, "by-hand", latestRunStatus="SUCCESS", eligible=False)
+
+    run_order_lease = RunOrderLease({"parallel": 2}, database_repository)
+    try:
+        assert run_order_lease.claim(run_order_id, require_eligible=False)
+    finally:
+        run_order_lease.release()